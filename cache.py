@@ -0,0 +1,220 @@
+"""
+Two tier cache for equity results
+The first tier is an in memory LRU, the second a local SQLite file so answers survive a restart
+"""
+import itertools
+import sqlite3
+from collections import OrderedDict
+
+from equity import enumerable, equity
+
+# Every way of relabeling the 4 suits, used to find the canonical form of a spot
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+
+def canonicalKey(hole, board, villain=None, tag: str = '') -> str:
+    """
+    Builds the same key for every spot that only differs by card order or by renaming suits
+    e.g. Ah Kh on a 2h 7c 9d flop and As Ks on a 9c 2s 7d flop share a key
+    :param hole: the 2 hole cards as card codes
+    :param board: the river cards as card codes
+    :param villain: the opponent's hole cards, None for a random hand
+    :param tag: extra text to separate different kinds of questions about the same cards
+    :type tag: str
+    :return: the cache key
+    :rtype: str
+    """
+    groups = [hole, board, villain or []]
+    best = None
+    for permutation in SUIT_PERMUTATIONS:
+        mapped = tuple(tuple(sorted(code & ~3 | permutation[code & 3] for code in group)) for group in groups)
+        if best is None or mapped < best:
+            best = mapped
+    return '|'.join(','.join(str(code) for code in group) for group in best) + '|' + tag
+
+
+class EquityCache:
+    """
+    LRU cache in memory backed by a size bounded SQLite table
+    Misses in memory fall through to disk, disk hits get promoted back into memory
+    """
+
+    def __init__(self, capacity: int = 4096, path: str = None, maxRows: int = 200000, commitEvery: int = 256):
+        """
+        Constructor method
+        :param capacity: how many results the in memory tier holds
+        :type capacity: int
+        :param path: SQLite file for the second tier, None to only cache in memory
+        :type path: str
+        :param maxRows: how many results the SQLite tier holds before the least recently used get evicted
+        :type maxRows: int
+        :param commitEvery: puts between commits, a crash loses at most this many results
+        :type commitEvery: int
+        """
+        self._capacity = capacity
+        self._maxRows = maxRows
+        self._memory = OrderedDict()
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.memoryEvictions = 0
+        self.diskEvictions = 0
+        self._commitEvery = commitEvery
+        self._db = None
+        self._clock = 0
+        self._rows = 0
+        self._puts = 0
+        # {key: clock} of memory hits whose use is not written to the SQLite tier yet
+        self._touched = {}
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS equity (key TEXT PRIMARY KEY, value REAL, used INTEGER)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS equityUsed ON equity (used)')
+            row = self._db.execute('SELECT COALESCE(MAX(used), 0), COUNT(*) FROM equity').fetchone()
+            self._clock, self._rows = row
+
+    def get(self, key: str):
+        """
+        :param key: key from canonicalKey()
+        :type key: str
+        :return: the cached value or None on a miss
+        """
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.memoryHits += 1
+            if self._db is not None:
+                # Stamped on disk in batches, keys that keep hitting in memory must not look unused to the disk tier
+                self._clock += 1
+                self._touched[key] = self._clock
+            return value
+        if self._db is not None:
+            row = self._db.execute('SELECT value FROM equity WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self._clock += 1
+                self._db.execute('UPDATE equity SET used = ? WHERE key = ?', (self._clock, key))
+                self._remember(key, row[0])
+                self.diskHits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: float):
+        """
+        Stores a result in both tiers
+        :param key: key from canonicalKey()
+        :type key: str
+        :param value: the result
+        :type value: float
+        """
+        self._remember(key, value)
+        if self._db is not None:
+            self._clock += 1
+            self._touched.pop(key, None)
+            inserted = self._db.execute('INSERT OR IGNORE INTO equity VALUES (?, ?, ?)',
+                                        (key, value, self._clock)).rowcount
+            if inserted:
+                self._rows += 1
+            else:
+                self._db.execute('UPDATE equity SET value = ?, used = ? WHERE key = ?', (value, self._clock, key))
+            if self._rows > self._maxRows:
+                self._evictRows()
+            self._puts += 1
+            if self._puts >= self._commitEvery:
+                self.flush()
+
+    def _remember(self, key, value):
+        """
+        Puts a result into the in memory tier, dropping the least recently used one when full
+        """
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._capacity:
+            self._memory.popitem(last=False)
+            self.memoryEvictions += 1
+
+    def _evictRows(self):
+        """
+        Trims the SQLite tier back to 90% of maxRows so eviction does not run on every insert
+        """
+        self._stamp()
+        keep = self._maxRows * 9 // 10
+        removed = self._db.execute('DELETE FROM equity WHERE key IN '
+                                   '(SELECT key FROM equity ORDER BY used LIMIT ?)', (self._rows - keep,)).rowcount
+        self._rows -= removed
+        self.diskEvictions += removed
+        self.flush()
+
+    def _stamp(self):
+        """
+        Writes the use of every key hit in memory since the last stamp to the SQLite tier
+        """
+        if self._touched:
+            self._db.executemany('UPDATE equity SET used = ? WHERE key = ?',
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched = {}
+
+    def lookup(self, key: str, compute):
+        """
+        Returns the cached value or computes and caches it
+        :param key: key from canonicalKey()
+        :type key: str
+        :param compute: function with no arguments that works out the value on a miss
+        :return: the value
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def equity(self, hole, board, villain=None, trials: int = 2000) -> float:
+        """
+        Cached version of equity.equity(), only exact enumerations are cached, a sampled estimate is too rough to keep
+        :param hole: the 2 hole cards
+        :param board: 0 to 5 river cards
+        :param villain: the opponent's hole cards, None for a random hand
+        :param trials: samples used when the spot is too big to enumerate
+        :type trials: int
+        :return: share of the pot won on average
+        :rtype: float
+        """
+        if not enumerable(board, villain):
+            return equity(hole, board, villain, trials)
+        key = canonicalKey(hole, board, villain, 'eq')
+        return self.lookup(key, lambda: equity(hole, board, villain, trials))
+
+    def hitRate(self) -> float:
+        """
+        :return: share of lookups answered by either tier
+        :rtype: float
+        """
+        total = self.memoryHits + self.diskHits + self.misses
+        return (self.memoryHits + self.diskHits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        """
+        :return: the hit, miss and eviction counters along with the size of each tier
+        :rtype: dict
+        """
+        return {'memoryHits': self.memoryHits, 'diskHits': self.diskHits, 'misses': self.misses,
+                'memoryEvictions': self.memoryEvictions, 'diskEvictions': self.diskEvictions,
+                'hitRate': self.hitRate(), 'memorySize': len(self._memory), 'diskSize': self._rows}
+
+    def flush(self):
+        """
+        Writes pending SQLite changes to disk
+        """
+        if self._db is not None:
+            self._stamp()
+            self._db.commit()
+            self._puts = 0
+
+    def close(self):
+        """
+        Commits and closes the SQLite file
+        """
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
@@ -0,0 +1,303 @@
+"""
+Offline counterfactual regret minimization solver for the betting structure Game uses
+Both hands start with the minimum wager in the pot and the river starts with 3 cards
+On the flop and the turn the player checks, raises between Game.MINIMUM_WAGER and the pot, or folds
+After a check the bot checks back or raises the minimum wager, after a raise it matches or folds
+River.newTurn deals the next card after every action and the hand goes to showdown once the river has 5 cards
+The bot's average strategy is written out as a policy table Strategy can load
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+
+from evaluator import evaluate
+from sharedtables import sharedPool
+from strategy import handBucket, spotKey
+
+# Same as Game.MINIMUM_WAGER, kept here so the solver does not need pygame
+MINIMUM_WAGER = 20
+# Streets with betting, the flop and the turn (see strategy.STREETS)
+BETTING_STREETS = [1, 2]
+# Player actions: fold, check, raise the minimum wager, raise the pot
+PLAYER_ACTIONS = ['f', 'c', 'r1', 'r2']
+
+
+def regretMatching(regrets) -> list:
+    """
+    Turns accumulated regrets into the current strategy
+    :param regrets: regret per action
+    :type regrets: list[float]
+    :return: probability per action
+    :rtype: list[float]
+    """
+    positive = [regret if regret > 0 else 0.0 for regret in regrets]
+    total = sum(positive)
+    if total > 0:
+        return [regret / total for regret in positive]
+    return [1.0 / len(regrets)] * len(regrets)
+
+
+def dealHand(rng) -> list:
+    """
+    Samples a deal and reduces it to what the betting tree needs
+    :param rng: random.Random to deal from
+    :return: the player's bucket per betting street, the bot's bucket per betting street
+     and the showdown result for the player (1 win, 0 tie, -1 loss)
+    :rtype: list
+    """
+    cards = rng.sample(range(52), 9)
+    playerHole = cards[0:2]
+    botHole = cards[2:4]
+    board = cards[4:9]
+    playerBuckets = [handBucket(playerHole, board[:street + 2]) for street in BETTING_STREETS]
+    botBuckets = [handBucket(botHole, board[:street + 2]) for street in BETTING_STREETS]
+    playerValue = evaluate(playerHole + board)
+    botValue = evaluate(botHole + board)
+    showdown = 1 if playerValue > botValue else -1 if playerValue < botValue else 0
+    return [playerBuckets, botBuckets, showdown]
+
+
+class Solver:
+    """
+    Chance sampled CFR+ over the abstracted game
+    Player information sets are keyed 'P:street:bucket', bot information sets use the same spotKey as Strategy
+    """
+
+    def __init__(self, seed: int = None):
+        """
+        Constructor method
+        :param seed: seed for dealing, None for a random seed
+        :type seed: int
+        """
+        self.regrets = {}
+        self.strategySums = {}
+        self.iterations = 0
+        self._rng = random.Random(seed)
+
+    def _node(self, key: str, actions: int) -> list:
+        """
+        :return: the current strategy of an information set, creating it on first visit
+        """
+        regrets = self.regrets.get(key)
+        if regrets is None:
+            regrets = self.regrets[key] = [0.0] * actions
+            self.strategySums[key] = [0.0] * actions
+        return regretMatching(regrets)
+
+    def _update(self, key: str, strategy, utilities, nodeUtility: float, opponentReach: float, ownReach: float):
+        """
+        Adds the counterfactual regrets of one visit to an information set, flooring them at zero (CFR+)
+        Utilities are from the point of view of whoever acts at the information set
+        """
+        regrets = self.regrets[key]
+        sums = self.strategySums[key]
+        for i in range(len(regrets)):
+            regrets[i] = max(0.0, regrets[i] + opponentReach * (utilities[i] - nodeUtility))
+            sums[i] += ownReach * strategy[i]
+
+    def _walk(self, deal, index: int, player: int, bot: int, playerReach: float, botReach: float) -> float:
+        """
+        Walks one betting round and everything after it
+        :param deal: result of dealHand()
+        :param index: position in BETTING_STREETS
+        :param player: chips the player has put in the pot so far
+        :param bot: chips the bot has put in the pot so far, more than the player once the bot bet into a check
+        :return: expected chips won by the player
+        :rtype: float
+        """
+        street = BETTING_STREETS[index]
+        playerKey = 'P:' + str(street) + ':' + str(deal[0][index])
+        playerStrategy = self._node(playerKey, len(PLAYER_ACTIONS))
+        utilities = [0.0] * len(PLAYER_ACTIONS)
+
+        # Fold
+        utilities[0] = -player
+
+        # Check, the bot checks back or raises the minimum wager, which the player does not get to answer
+        checkKey = spotKey(street, deal[1][index], 'c')
+        botStrategy = self._node(checkKey, 2)
+        p = playerReach * playerStrategy[1]
+        botUtilities = [self._next(deal, index, player, bot, p, botReach * botStrategy[0]),
+                        self._next(deal, index, player, bot + MINIMUM_WAGER, p, botReach * botStrategy[1])]
+        utilities[1] = botStrategy[0] * botUtilities[0] + botStrategy[1] * botUtilities[1]
+        self._update(checkKey, botStrategy, [-u for u in botUtilities], -utilities[1], p, botReach)
+
+        # Raises, the bot folds or matches
+        raiseKey = spotKey(street, deal[1][index], 'r')
+        botStrategy = self._node(raiseKey, 2)
+        for action, amount in [(2, MINIMUM_WAGER), (3, player + bot)]:
+            p = playerReach * playerStrategy[action]
+            botUtilities = [bot, self._next(deal, index, player + amount, bot + amount, p, botReach * botStrategy[1])]
+            utilities[action] = botStrategy[0] * botUtilities[0] + botStrategy[1] * botUtilities[1]
+            self._update(raiseKey, botStrategy, [-u for u in botUtilities], -utilities[action], p, botReach)
+
+        nodeUtility = sum(playerStrategy[i] * utilities[i] for i in range(len(PLAYER_ACTIONS)))
+        self._update(playerKey, playerStrategy, utilities, nodeUtility, botReach, playerReach)
+        return nodeUtility
+
+    def _next(self, deal, index: int, player: int, bot: int, playerReach: float, botReach: float) -> float:
+        """
+        Moves to the next betting round or to the showdown after the last one
+        """
+        if index + 1 < len(BETTING_STREETS):
+            return self._walk(deal, index + 1, player, bot, playerReach, botReach)
+        # The winner takes what the other put in, a tie splits the pot
+        if deal[2] > 0:
+            return bot
+        if deal[2] < 0:
+            return -player
+        return (bot - player) / 2
+
+    def iterate(self, count: int):
+        """
+        Runs count iterations, each on a freshly sampled deal
+        :param count: number of iterations
+        :type count: int
+        """
+        for _ in range(count):
+            self._walk(dealHand(self._rng), 0, MINIMUM_WAGER, MINIMUM_WAGER, 1.0, 1.0)
+        self.iterations += count
+
+    def merge(self, regrets: dict, strategySums: dict, iterations: int):
+        """
+        Adds the regret and strategy sum changes a worker made
+        :param regrets: regret change per information set
+        :type regrets: dict
+        :param strategySums: strategy sum change per information set
+        :type strategySums: dict
+        :param iterations: how many iterations the worker ran
+        :type iterations: int
+        """
+        for key, delta in regrets.items():
+            current = self.regrets.setdefault(key, [0.0] * len(delta))
+            self.regrets[key] = [max(0.0, current[i] + delta[i]) for i in range(len(delta))]
+        for key, delta in strategySums.items():
+            current = self.strategySums.setdefault(key, [0.0] * len(delta))
+            self.strategySums[key] = [current[i] + delta[i] for i in range(len(delta))]
+        self.iterations += iterations
+
+    def averageStrategy(self, key: str) -> list:
+        """
+        :param key: information set key
+        :type key: str
+        :return: the average strategy over all iterations, the one that converges to equilibrium
+        :rtype: list[float]
+        """
+        sums = self.strategySums[key]
+        total = sum(sums)
+        if total > 0:
+            return [value / total for value in sums]
+        return [1.0 / len(sums)] * len(sums)
+
+    def policy(self) -> dict:
+        """
+        :return: the bot's average strategy as a policy table for Strategy
+        :rtype: dict
+        """
+        return {key: self.averageStrategy(key) for key in self.strategySums if not key.startswith('P:')}
+
+    def save(self, path: str):
+        """
+        Writes a checkpoint, written to a temporary file first so a crash never leaves half a checkpoint
+        :param path: checkpoint file
+        :type path: str
+        """
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'iterations': self.iterations, 'regrets': self.regrets,
+                       'strategySums': self.strategySums}, file)
+        os.replace(path + '.tmp', path)
+
+    def load(self, path: str):
+        """
+        Resumes from a checkpoint written by save()
+        :param path: checkpoint file
+        :type path: str
+        """
+        with open(path) as file:
+            data = json.load(file)
+        self.iterations = data['iterations']
+        self.regrets = data['regrets']
+        self.strategySums = data['strategySums']
+
+
+def _runBatch(task) -> list:
+    """
+    Worker side of solve(), runs a batch of iterations from the shared regrets and returns what changed
+    :param task: [regrets, seed, count]
+    :return: [regret changes, strategy sum changes, count]
+    :rtype: list
+    """
+    regrets, seed, count = task
+    solver = Solver(seed)
+    solver.regrets = {key: list(values) for key, values in regrets.items()}
+    solver.strategySums = {key: [0.0] * len(values) for key, values in regrets.items()}
+    solver.iterate(count)
+    regretChanges = {}
+    for key, values in solver.regrets.items():
+        start = regrets.get(key, [0.0] * len(values))
+        regretChanges[key] = [values[i] - start[i] for i in range(len(values))]
+    return [regretChanges, solver.strategySums, count]
+
+
+def solve(iterations: int, workers: int = 1, batch: int = 2000, checkpoint: str = None, seed: int = None) -> Solver:
+    """
+    Runs the solver, spreading batches of iterations over worker processes
+    Workers all start each round from the same regrets and their changes are summed afterwards
+    :param iterations: total iterations wanted, including any already in the checkpoint
+    :type iterations: int
+    :param workers: number of worker processes, 1 runs everything in this process
+    :type workers: int
+    :param batch: iterations per worker between merges and checkpoints
+    :type batch: int
+    :param checkpoint: file to resume from and save to, None to not checkpoint
+    :type checkpoint: str
+    :param seed: seed for the deals, None for a random one
+    :type seed: int
+    :return: the solver
+    :rtype: Solver
+    """
+    solver = Solver(seed)
+    if checkpoint is not None and os.path.exists(checkpoint):
+        solver.load(checkpoint)
+    # Workers attach to the published lookup tables instead of each building their own
+    with sharedPool(workers) if workers > 1 else contextlib.nullcontext() as pool:
+        while solver.iterations < iterations:
+            count = min(batch, (iterations - solver.iterations + workers - 1) // workers)
+            # Each round's deals follow from the seed and how far the solver already got, so a run resumed from a
+            # checkpoint goes on to new deals instead of replaying the ones it already learned from
+            rng = random.Random(None if seed is None else str(seed) + ':' + str(solver.iterations))
+            if pool is None:
+                solver._rng = rng
+                solver.iterate(count)
+            else:
+                tasks = [[solver.regrets, rng.getrandbits(32), count] for _ in range(workers)]
+                for result in pool.imap_unordered(_runBatch, tasks):
+                    solver.merge(*result)
+            if checkpoint is not None:
+                solver.save(checkpoint)
+    return solver
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Solves the game from the command line and writes the bot's policy table
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Solve the betting game with CFR')
+        parser.add_argument('--iterations', type=int, default=200000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch', type=int, default=2000)
+        parser.add_argument('--checkpoint', default='cfr_checkpoint.json')
+        parser.add_argument('--output', default='policy.json')
+        parser.add_argument('--seed', type=int, default=None)
+        args = parser.parse_args()
+        solver = solve(args.iterations, args.workers, args.batch, args.checkpoint, args.seed)
+        with open(args.output, 'w') as file:
+            json.dump(solver.policy(), file, indent=1)
+        print('Solved', solver.iterations, 'iterations,', len(solver.regrets), 'information sets')
+
+
+    main()
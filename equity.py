@@ -0,0 +1,241 @@
+"""
+Equity of a hand against a known hand or a random one
+All cards are card codes from evaluator
+"""
+import itertools
+import math
+import random
+import time
+from statistics import NormalDist
+
+from evaluator import BIT, cardMask, evaluate
+
+# Samples every stratum gets before adaptiveEquity() starts steering samples by their spread
+PILOT_SAMPLES = 16
+# Weight, in samples, of the whole spot's spread in each stratum's variance
+PRIOR_SAMPLES = 64
+
+
+def remainingCards(dead) -> list:
+    """
+    :param dead: card codes that are already out of the deck
+    :return: every card code still left in the deck
+    :rtype: list[int]
+    """
+    mask = cardMask(dead)
+    return [code for code in range(52) if not mask & BIT[code]]
+
+
+def enumerateEquity(hole, board, villain=None) -> float:
+    """
+    Exact equity found by going through every possible runout
+    Only cheap enough with a known villain hand on the flop or later, or a random villain on the river
+    :param hole: the 2 hole cards
+    :param board: 0 to 5 river cards
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :return: share of the pot won on average, ties count as half
+    :rtype: float
+    """
+    deck = remainingCards(list(hole) + list(board) + list(villain or []))
+    total = 0.0
+    count = 0
+    if villain is None:
+        for runout in itertools.combinations(deck, 5 - len(board)):
+            full = list(board) + list(runout)
+            heroValue = evaluate(list(hole) + full)
+            left = [code for code in deck if code not in runout]
+            for other in itertools.combinations(left, 2):
+                villainValue = evaluate(list(other) + full)
+                total += 1.0 if heroValue > villainValue else 0.5 if heroValue == villainValue else 0.0
+                count += 1
+    else:
+        for runout in itertools.combinations(deck, 5 - len(board)):
+            full = list(board) + list(runout)
+            heroValue = evaluate(list(hole) + full)
+            villainValue = evaluate(list(villain) + full)
+            total += 1.0 if heroValue > villainValue else 0.5 if heroValue == villainValue else 0.0
+            count += 1
+    return total / count
+
+
+def monteCarloEquity(hole, board, villain=None, trials: int = 2000, rng=None) -> float:
+    """
+    Equity estimated from random runouts (and random villain hands if the villain is unknown)
+    :param hole: the 2 hole cards
+    :param board: 0 to 5 river cards
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :param trials: how many runouts to sample
+    :type trials: int
+    :param rng: random.Random to draw from, the random module by default
+    :return: share of the pot won on average, ties count as half
+    :rtype: float
+    """
+    rng = rng or random
+    hole = list(hole)
+    board = list(board)
+    deck = remainingCards(hole + board + list(villain or []))
+    missing = 5 - len(board)
+    need = missing + (2 if villain is None else 0)
+    total = 0.0
+    for _ in range(trials):
+        drawn = rng.sample(deck, need)
+        full = board + drawn[:missing]
+        other = list(villain) if villain is not None else drawn[missing:]
+        heroValue = evaluate(hole + full)
+        villainValue = evaluate(other + full)
+        total += 1.0 if heroValue > villainValue else 0.5 if heroValue == villainValue else 0.0
+    return total / trials
+
+
+def enumerable(board, villain=None) -> bool:
+    """
+    :param board: 0 to 5 river cards
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :return: whether enumerating every runout is cheap enough that equity() does it instead of sampling
+    :rtype: bool
+    """
+    return (villain is not None and len(board) >= 3) or len(board) == 5
+
+
+def equity(hole, board, villain=None, trials: int = 2000) -> float:
+    """
+    Picks exact enumeration when it is cheap and sampling otherwise
+    :param hole: the 2 hole cards
+    :param board: 0 to 5 river cards
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :param trials: samples used when the spot is too big to enumerate
+    :type trials: int
+    :return: share of the pot won on average, ties count as half
+    :rtype: float
+    """
+    if enumerable(board, villain):
+        return enumerateEquity(hole, board, villain)
+    return monteCarloEquity(hole, board, villain, trials)
+
+
+def timedEquity(hole, board, villain=None, budget: float = 0.001, batch: int = 8, rng=None) -> list:
+    """
+    Samples runouts until the time budget runs out, for callers that need an answer by a deadline
+    The cost of a runout is measured as it goes and no batch is started that would end past the deadline
+    :param hole: the 2 hole cards
+    :param board: 0 to 5 river cards
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :param budget: seconds allowed, always at least one runout is sampled even if the budget is already spent
+    :type budget: float
+    :param batch: most runouts sampled between clock checks
+    :type batch: int
+    :param rng: random.Random to draw from, the random module by default
+    :return: the estimated equity and how many runouts it is based on
+    :rtype: list
+    """
+    start = time.perf_counter()
+    deadline = start + budget
+    total = 0.0
+    samples = 0
+    size = 1
+    slowest = 0.0
+    now = start
+    while size > 0:
+        total += monteCarloEquity(hole, board, villain, size, rng) * size
+        samples += size
+        last, now = now, time.perf_counter()
+        # Cost of a runout in the slowest batch so far, setting up the batch included, so the next batch is only
+        # started when even at that rate it ends before the deadline, with one runout's time to spare for the caller
+        slowest = max(slowest, (now - last) / size)
+        size = min(batch, int((deadline - now) / slowest) - 1)
+    return [total / samples, samples]
+
+
+def _strata(known, deck) -> list:
+    """
+    Groups the possible next board cards into strata, cards that only differ by a suit none of the known cards has
+    give the same equity so they share a stratum
+    :return: [card, cards left once it is dealt, how many next cards the stratum stands for] per stratum
+    """
+    used = {code & 3 for code in known}
+    free = [suit for suit in range(4) if suit not in used]
+    weights = {}
+    for card in deck:
+        if card & 3 in free:
+            card = card & ~3 | free[0]
+        weights[card] = weights.get(card, 0) + 1
+    return [[card, [code for code in deck if code != card], weight] for card, weight in weights.items()]
+
+
+def adaptiveEquity(hole, board, villain=None, precision: float = 0.01, confidence: float = 0.95,
+                   budget: float = None, batch: int = 64, maxSamples: int = 200000, rng=None) -> list:
+    """
+    Samples runouts until the equity is known to within a confidence interval, or until the time budget runs out
+    Runouts are stratified by the next board card, after a pilot round more samples go to the strata whose
+    results vary the most (Neyman allocation), so the turn cards that settle a lopsided spot are barely sampled
+    :param hole: the 2 hole cards
+    :param board: 0 to 5 river cards, a full board is enumerated
+    :param villain: the 2 hole cards of the opponent, None for a random hand
+    :param precision: stop once the confidence interval is no wider than this either side of the estimate
+    :type precision: float
+    :param confidence: confidence level of the interval
+    :type confidence: float
+    :param budget: seconds allowed, None for no limit, the pilot round is always finished
+    :type budget: float
+    :param batch: samples between checks of the interval and the clock
+    :type batch: int
+    :param maxSamples: stop after this many samples whatever the interval
+    :type maxSamples: int
+    :param rng: random.Random to draw from, the random module by default
+    :return: the estimated equity, the half width of its confidence interval and how many samples it is based on
+    :rtype: list
+    """
+    rng = rng or random
+    deadline = None if budget is None else time.perf_counter() + budget
+    hole = list(hole)
+    board = list(board)
+    known = hole + board + list(villain or [])
+    deck = remainingCards(known)
+    missing = 5 - len(board)
+    if missing == 0:
+        return [enumerateEquity(hole, board, villain), 0.0, 1 if villain is not None else math.comb(len(deck), 2)]
+    # The next board card picks the stratum, the rest of the runout and a random villain are drawn from what is left
+    need = missing - 1 + (2 if villain is None else 0)
+    strata = _strata(known, deck)
+    cards = sum(weight for card, rest, weight in strata)
+    shares = [weight / cards for card, rest, weight in strata]
+    z = NormalDist().inv_cdf((1.0 + confidence) / 2.0)
+    counts = [0] * len(strata)
+    sums = [0.0] * len(strata)
+    squares = [0.0] * len(strata)
+    # Pilot round, enough samples per stratum that its own spread starts to mean something
+    picks = list(range(len(strata))) * PILOT_SAMPLES
+    samples = 0
+    while True:
+        for index in picks:
+            card, rest, weight = strata[index]
+            drawn = [card] + rng.sample(rest, need)
+            full = board + drawn[:missing]
+            other = villain if villain is not None else drawn[missing:]
+            heroValue = evaluate(hole + full)
+            villainValue = evaluate(list(other) + full)
+            value = 1.0 if heroValue > villainValue else 0.5 if heroValue == villainValue else 0.0
+            counts[index] += 1
+            sums[index] += value
+            squares[index] += value * value
+        samples += len(picks)
+        estimate = sum(share * total / count for share, total, count in zip(shares, sums, counts))
+        # Variance of one sample in each stratum, its own spread pulled towards the spread of the whole spot as if
+        # the stratum also had PRIOR_SAMPLES samples from it, so a stratum that happened to give the same result
+        # every time is neither trusted to be settled nor starved of samples
+        # The whole spot's spread is taken at the end of the wanted interval nearest to even, a lopsided estimate
+        # would otherwise claim too little spread exactly when it is too lopsided
+        nearest = min(max(0.5, estimate - precision), estimate + precision)
+        pooled = nearest * (1.0 - nearest)
+        variances = [(square - total * total / count + PRIOR_SAMPLES * pooled) / (count - 1 + PRIOR_SAMPLES)
+                     for total, square, count in zip(sums, squares, counts)]
+        halfWidth = z * math.sqrt(sum(share * share * variance / count
+                                      for share, variance, count in zip(shares, variances, counts)))
+        if halfWidth <= precision or samples >= maxSamples:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        # Next samples go where they shrink the interval most, share * standard deviation of one sample
+        spreads = [share * math.sqrt(variance) for share, variance in zip(shares, variances)]
+        picks = rng.choices(range(len(strata)), spreads, k=batch)
+    return [estimate, halfWidth, samples]
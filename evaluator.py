@@ -0,0 +1,239 @@
+"""
+Fast hand evaluation used by the equity, bot and analysis code
+Cards are plain ints from 0 to 51 in the same order the Deck builds them: (rank - 1) * 4 + suit index
+so no pygame surfaces are needed to score a hand
+"""
+
+SUITS = ['c', 'd', 'h', 's']
+
+# Hand categories, higher is better (score() counts the other way, 0 is a royal flush)
+HIGH_CARD = 0
+ONE_PAIR = 1
+TWO_PAIR = 2
+THREE_OF_A_KIND = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+FOUR_OF_A_KIND = 7
+STRAIGHT_FLUSH = 8
+
+CATEGORY_NAMES = ["High Card", "One Pair", "Two Pair", "Three of a Kind", "Straight", "Flush", "Full House",
+                  "Four of a Kind", "Straight Flush"]
+
+# Value of a card from 0 (deuce) to 12 (ace) and its suit index, looked up by card code
+VALUE = [((code >> 2) - 1) % 13 for code in range(52)]
+SUIT = [code & 3 for code in range(52)]
+# Bit of every card in a 52 bit mask
+BIT = [1 << code for code in range(52)]
+
+
+def _buildStraights():
+    """
+    Finds the highest straight contained in every 13 bit set of card values
+    :return: list of 8192 entries holding the high card value + 1 of the straight, 0 if there is none
+    :rtype: list[int]
+    """
+    table = [0] * 8192
+    for bits in range(8192):
+        for high in range(12, 3, -1):
+            window = 0x1F << (high - 4)
+            if bits & window == window:
+                table[bits] = high + 1
+                break
+        else:
+            # A, 2, 3, 4, 5 is the lowest straight
+            if bits & 0x100F == 0x100F:
+                table[bits] = 4
+    return table
+
+
+def _buildTopFive():
+    """
+    Packs the 5 highest card values of every 13 bit set into nibbles so they can be compared as one int
+    :return: list of 8192 packed kicker values
+    :rtype: list[int]
+    """
+    table = [0] * 8192
+    for bits in range(8192):
+        packed = 0
+        taken = 0
+        for value in range(12, -1, -1):
+            if bits >> value & 1:
+                packed = packed << 4 | value
+                taken += 1
+                if taken == 5:
+                    break
+        table[bits] = packed << 4 * (5 - taken)
+    return table
+
+
+# Built on first use, a worker that attaches to shared tables with useTables() first never builds its own
+STRAIGHTS = None
+TOP_FIVE = None
+
+
+def tables() -> list:
+    """
+    :return: [STRAIGHTS, TOP_FIVE], built the first time they are needed
+    :rtype: list
+    """
+    global STRAIGHTS, TOP_FIVE
+    if STRAIGHTS is None:
+        STRAIGHTS = _buildStraights()
+        TOP_FIVE = _buildTopFive()
+    return [STRAIGHTS, TOP_FIVE]
+
+
+def useTables(straights, topFive):
+    """
+    Switches evaluate() to lookup tables built elsewhere, such as memoryviews over shared memory
+    :param straights: 8192 entries laid out like STRAIGHTS
+    :param topFive: 8192 entries laid out like TOP_FIVE
+    """
+    global STRAIGHTS, TOP_FIVE
+    STRAIGHTS = straights
+    TOP_FIVE = topFive
+
+
+def cardCode(rank, suit: str) -> int:
+    """
+    Converts a rank and suit the way Card stores them into a card code
+    :param rank: 1-13 Ace to King, either as an int or as the str Card.getRank() returns
+    :param suit: 'c', 'd', 'h' or 's'
+    :type suit: str
+    :return: card code from 0 to 51
+    :rtype: int
+    """
+    return (int(rank) - 1) * 4 + SUITS.index(suit)
+
+
+def codeToCard(code: int) -> list:
+    """
+    Converts a card code back into the [rank, suit] pair used by score()
+    :param code: card code from 0 to 51
+    :type code: int
+    :return: [rank, suit]
+    :rtype: list
+    """
+    return [(code >> 2) + 1, SUITS[code & 3]]
+
+
+def codeToName(code: int) -> str:
+    """
+    :param code: card code from 0 to 51
+    :type code: int
+    :return: the filename stem the card images use, for example '12h'
+    :rtype: str
+    """
+    return str((code >> 2) + 1) + SUITS[code & 3]
+
+
+def handToCodes(hand) -> list:
+    """
+    Converts a hand from addRiver() into card codes
+    :param hand: 2-d list containing rank and suit
+    :type hand: list
+    :return: list of card codes
+    :rtype: list[int]
+    """
+    return [cardCode(card[0], card[1]) for card in hand]
+
+
+def cardMask(codes) -> int:
+    """
+    :param codes: card codes
+    :return: 52 bit mask with one bit set per card
+    :rtype: int
+    """
+    mask = 0
+    for code in codes:
+        mask |= BIT[code]
+    return mask
+
+
+def evaluate(codes) -> int:
+    """
+    Scores the best 5 card hand out of 5 to 7 cards
+    :param codes: card codes
+    :return: the category in bits 20 and up with the tie breaking card values packed below it, higher is better
+    :rtype: int
+    """
+    if STRAIGHTS is None:
+        tables()
+    rankBits = 0
+    suitBits = [0, 0, 0, 0]
+    counts = [0] * 13
+    for code in codes:
+        value = VALUE[code]
+        bit = 1 << value
+        rankBits |= bit
+        suitBits[code & 3] |= bit
+        counts[value] += 1
+
+    flushBits = 0
+    for bits in suitBits:
+        if bin(bits).count('1') >= 5:
+            flushBits = bits
+            break
+    if flushBits:
+        high = STRAIGHTS[flushBits]
+        if high:
+            return STRAIGHT_FLUSH << 20 | (high - 1) << 16
+
+    quad = -1
+    trips = []
+    pairs = []
+    for value in range(12, -1, -1):
+        count = counts[value]
+        if count == 4:
+            quad = value
+        elif count == 3:
+            trips.append(value)
+        elif count == 2:
+            pairs.append(value)
+
+    if quad >= 0:
+        kicker = TOP_FIVE[rankBits & ~(1 << quad)] >> 16
+        return FOUR_OF_A_KIND << 20 | quad << 16 | kicker << 12
+    if trips and (len(trips) > 1 or pairs):
+        pair = trips[1] if len(trips) > 1 else -1
+        if pairs and pairs[0] > pair:
+            pair = pairs[0]
+        return FULL_HOUSE << 20 | trips[0] << 16 | pair << 12
+    if flushBits:
+        return FLUSH << 20 | TOP_FIVE[flushBits]
+    high = STRAIGHTS[rankBits]
+    if high:
+        return STRAIGHT << 20 | (high - 1) << 16
+    if trips:
+        kickers = TOP_FIVE[rankBits & ~(1 << trips[0])] >> 12
+        return THREE_OF_A_KIND << 20 | trips[0] << 16 | kickers << 8
+    if len(pairs) >= 2:
+        kicker = TOP_FIVE[rankBits & ~(1 << pairs[0]) & ~(1 << pairs[1])] >> 16
+        return TWO_PAIR << 20 | pairs[0] << 16 | pairs[1] << 12 | kicker << 8
+    if pairs:
+        kickers = TOP_FIVE[rankBits & ~(1 << pairs[0])] >> 8
+        return ONE_PAIR << 20 | pairs[0] << 16 | kickers << 4
+    return HIGH_CARD << 20 | TOP_FIVE[rankBits]
+
+
+def category(value: int) -> int:
+    """
+    :param value: result of evaluate()
+    :type value: int
+    :return: the hand category, HIGH_CARD up to STRAIGHT_FLUSH
+    :rtype: int
+    """
+    return value >> 20
+
+
+def categoryName(value: int) -> str:
+    """
+    :param value: result of evaluate()
+    :type value: int
+    :return: the same hand names score() uses
+    :rtype: str
+    """
+    if value >> 20 == STRAIGHT_FLUSH and value >> 16 & 0xF == 12:
+        return "Royal Flush"
+    return CATEGORY_NAMES[value >> 20]
@@ -0,0 +1,210 @@
+"""
+Streaming importer for PokerStars style hand history text files
+Files are read in large chunks cut on hand boundaries, chunks are parsed by a pool of workers and every chunk
+comes back as one columnar batch: a dict of flat arrays, one entry per hand (or per shown hand)
+Cards use the same rank 1-13 and suit 'c'/'d'/'h'/'s' convention as Card, stored as evaluator card codes
+"""
+import argparse
+import collections
+import os
+import re
+import time
+from array import array
+
+from evaluator import categoryName, evaluate
+from ranges import parseCard
+from sharedtables import sharedPool
+
+HAND_START = re.compile(r'^\S.*? Hand #(\d+)', re.M)
+BOARD = re.compile(r'^Board \[([^\]]*)\]', re.M)
+DEALT = re.compile(r'^Dealt to (.+?) \[([^\]]*)\]', re.M)
+SHOWS = re.compile(r'^(.+?): shows \[([^\]]*)\]', re.M)
+# Summary lines such as 'Seat 1: Alice (button) collected (40)' repeat the winner, only action lines count
+COLLECTED = re.compile(r'^(?!Seat \d+:)(.+?) collected \D?([\d.,]+)', re.M)
+TOTAL_POT = re.compile(r'^Total pot \D?([\d.,]+)', re.M)
+# Hands are separated by at least one empty line
+SEPARATOR = re.compile(r'\n\s*\n')
+
+# Columns of a batch, the show columns hold one entry per shown hand and showStart points into them
+HAND_COLUMNS = {'handId': 'q', 'pot': 'd', 'board0': 'b', 'board1': 'b', 'board2': 'b', 'board3': 'b',
+                'board4': 'b', 'hero1': 'b', 'hero2': 'b', 'showStart': 'l', 'showCount': 'b'}
+SHOW_COLUMNS = {'showCard1': 'b', 'showCard2': 'b', 'showValue': 'l', 'showWon': 'b'}
+
+
+def cardName(token: str) -> str:
+    """
+    :param token: a card as hand histories write it, such as 'Th'
+    :type token: str
+    :return: the name Card uses for the same card, such as '10h'
+    :rtype: str
+    """
+    code = parseCard(token)
+    return str((code >> 2) + 1) + token[1].lower()
+
+
+def _cards(text: str) -> list:
+    """
+    :return: card codes of a space separated card list such as 'Ah Kd'
+    """
+    return [parseCard(token) for token in text.split()]
+
+
+def _amount(text: str) -> float:
+    return float(text.replace(',', ''))
+
+
+def newBatch() -> dict:
+    """
+    :return: an empty columnar batch
+    :rtype: dict
+    """
+    batch = {name: array(typecode) for name, typecode in HAND_COLUMNS.items()}
+    batch.update({name: array(typecode) for name, typecode in SHOW_COLUMNS.items()})
+    batch['winner'] = []
+    batch['winningHand'] = []
+    batch['showPlayer'] = []
+    return batch
+
+
+def parseHand(text: str, batch: dict) -> bool:
+    """
+    Parses one hand and appends it to a batch
+    Shown hands are scored the way score() would, the best hand and its name end up in the batch
+    :param text: the text of a single hand
+    :type text: str
+    :param batch: batch from newBatch()
+    :type batch: dict
+    :return: False if the text is not a hand
+    :rtype: bool
+    """
+    start = HAND_START.search(text)
+    if start is None:
+        return False
+    board = BOARD.search(text)
+    boardCards = _cards(board.group(1)) if board else []
+    dealt = DEALT.search(text)
+    hero = _cards(dealt.group(2)) if dealt else []
+    pot = TOTAL_POT.search(text)
+    winners = {match.group(1) for match in COLLECTED.finditer(text)}
+
+    batch['handId'].append(int(start.group(1)))
+    batch['pot'].append(_amount(pot.group(1)) if pot else 0.0)
+    for i in range(5):
+        batch['board' + str(i)].append(boardCards[i] if i < len(boardCards) else -1)
+    batch['hero1'].append(hero[0] if len(hero) == 2 else -1)
+    batch['hero2'].append(hero[1] if len(hero) == 2 else -1)
+    batch['showStart'].append(len(batch['showPlayer']))
+
+    shown = 0
+    best = -1
+    bestName = ''
+    for match in SHOWS.finditer(text):
+        cards = _cards(match.group(2))
+        if len(cards) != 2:
+            continue
+        value = evaluate(cards + boardCards) if len(boardCards) == 5 else -1
+        batch['showPlayer'].append(match.group(1))
+        batch['showCard1'].append(cards[0])
+        batch['showCard2'].append(cards[1])
+        batch['showValue'].append(value)
+        batch['showWon'].append(match.group(1) in winners)
+        if value > best:
+            best = value
+            bestName = categoryName(value)
+        shown += 1
+    batch['showCount'].append(shown)
+    batch['winner'].append(','.join(sorted(winners)))
+    batch['winningHand'].append(bestName)
+    return True
+
+
+def parseChunk(text: str) -> dict:
+    """
+    Worker side of importFile(), parses every hand in a chunk
+    :param text: whole hands separated by empty lines
+    :type text: str
+    :return: columnar batch of the chunk's hands
+    :rtype: dict
+    """
+    batch = newBatch()
+    for hand in SEPARATOR.split(text):
+        parseHand(hand, batch)
+    return batch
+
+
+def readChunks(path: str, chunkSize: int = 1 << 23):
+    """
+    Reads a file in large pieces, each one cut after the last complete hand it holds
+    :param path: hand history file
+    :type path: str
+    :param chunkSize: bytes read at a time
+    :type chunkSize: int
+    :return: generator of text chunks
+    """
+    leftover = ''
+    with open(path, encoding='utf-8-sig', errors='replace', newline=None) as file:
+        while True:
+            data = file.read(chunkSize)
+            if not data:
+                break
+            data = leftover + data
+            cut = data.rfind('\n\n')
+            if cut < 0:
+                leftover = data
+                continue
+            leftover = data[cut + 2:]
+            yield data[:cut]
+    if leftover.strip():
+        yield leftover
+
+
+def importFile(path: str, workers: int = None, chunkSize: int = 1 << 23):
+    """
+    Streams a hand history file through a pool of parsers
+    :param path: hand history file
+    :type path: str
+    :param workers: parser processes, None for one per CPU, 1 to parse in this process
+    :type workers: int
+    :param chunkSize: bytes read at a time
+    :type chunkSize: int
+    :return: generator of columnar batches in file order
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in readChunks(path, chunkSize):
+            yield parseChunk(chunk)
+        return
+    with sharedPool(workers) as pool:
+        # Pool.imap would read the whole file into its task queue up front, so at most two chunks per worker are
+        # read ahead and memory stays flat however large the file is
+        pending = collections.deque()
+        for chunk in readChunks(path, chunkSize):
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(parseChunk, (chunk,)))
+        while pending:
+            yield pending.popleft().get()
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Imports a file and prints how many hands and showdowns it held
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Import a hand history file')
+        parser.add_argument('path')
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--chunk', type=int, default=1 << 23, help='bytes read at a time')
+        args = parser.parse_args()
+        start = time.perf_counter()
+        hands = 0
+        showdowns = 0
+        for batch in importFile(args.path, args.workers, args.chunk):
+            hands += len(batch['handId'])
+            showdowns += sum(1 for count in batch['showCount'] if count > 1)
+        seconds = time.perf_counter() - start
+        print(hands, 'hands,', showdowns, 'showdowns in', round(seconds, 2), 's')
+
+
+    main()
@@ -1,9 +1,146 @@
+import os
 import pygame
 import random
+import struct
+import time
+
+import evaluator
+import metrics
+from evaluator import cardCode, codeToName, evaluate, handToCodes
+from stats import PlayerStats
+from strategy import Strategy
+from worker import JobPool
 
 pygame.init()
-# Width and Height of the Window
+# Width and Height of the Window when it opens, everything is laid out in these coordinates and scaled to the window
 DIMENSIONS = [900, 740]
+# Solved policy table for the bot, the built in default policy is used when it is missing
+POLICY_FILE = 'policy.json'
+# Where the player and bot statistics are kept between sessions
+STATS_FILE = 'stats.bin'
+# The card images, loaded from here whatever the working directory is
+ASSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DECK')
+# Port of the local metrics endpoint, it only runs when this environment variable is set
+METRICS_PORT = os.environ.get('TEXASHOLDEM_METRICS_PORT')
+
+HANDS_COMPLETED = metrics.REGISTRY.counter('texasholdem_hands_completed_total', 'Hands played to the end',
+                                           ['end'])
+EVALUATOR_CALLS = metrics.REGISTRY.counter('texasholdem_evaluator_calls_total',
+                                           'Showdowns scored and bot decisions made', ['caller'])
+EVALUATOR_SECONDS = metrics.REGISTRY.histogram('texasholdem_evaluator_seconds',
+                                               'Time taken by one showdown score or bot decision')
+FRAME_SECONDS = metrics.REGISTRY.summary('texasholdem_frame_seconds',
+                                         'Time spent drawing and handling events in one frame')
+CACHE_REQUESTS = metrics.REGISTRY.counter('texasholdem_cache_requests_total', 'Card image and text cache lookups',
+                                          ['cache', 'result'])
+EVENT_QUEUE_DEPTH = metrics.REGISTRY.gauge('texasholdem_event_queue_depth',
+                                           'Events waiting when the last frame started handling them')
+
+# Posted when a background job finishes, the event's job attribute holds the Job
+JOB_DONE = pygame.USEREVENT + 1
+
+SNAPSHOT_MAGIC = b'THGS'
+SNAPSHOT_VERSION = 1
+# magic, version, state, pot, most recent button, quit, raise prompt, last raise, then how many cards the river
+# and the deck hold, the card codes of the player, bot, river and deck follow one byte each
+SNAPSHOT_HEADER = struct.Struct('<4sHBiB?5s5sBB')
+
+
+class Layout:
+    """
+    Maps the DIMENSIONS coordinates everything is laid out in onto a window of any size
+    The game is scaled evenly to fit the window and centered, scaled surfaces and fonts are made once per window
+    size and reused every frame
+    """
+
+    def __init__(self, size):
+        """
+        Constructor method
+        :param size: width and height of the window
+        """
+        self.size = list(size)
+        self.scale = 1.0
+        self._offset = [0.0, 0.0]
+        self._scaled = {}
+        self._fonts = {}
+        self.resize(size)
+
+    def resize(self, size):
+        """
+        Fits the layout to a new window size, throwing away what was scaled for the old one
+        :param size: width and height of the window
+        """
+        self.size = list(size)
+        self.scale = min(size[0] / DIMENSIONS[0], size[1] / DIMENSIONS[1])
+        self._offset = [(size[0] - DIMENSIONS[0] * self.scale) / 2, (size[1] - DIMENSIONS[1] * self.scale) / 2]
+        self._scaled = {}
+        self._fonts = {}
+
+    def point(self, pos) -> list[int]:
+        """
+        :param pos: position in layout coordinates
+        :return: the same position in the window
+        :rtype: list[int]
+        """
+        return [round(self._offset[0] + pos[0] * self.scale), round(self._offset[1] + pos[1] * self.scale)]
+
+    def rect(self, pos, size):
+        """
+        :param pos: top left corner in layout coordinates
+        :param size: width and height in layout coordinates
+        :return: the rectangle in the window
+        :rtype: pygame.Rect
+        """
+        left, top = self.point(pos)
+        right, bottom = self.point([pos[0] + size[0], pos[1] + size[1]])
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def toLayout(self, pos) -> list:
+        """
+        Maps a window position such as the mouse back into layout coordinates
+        :param pos: position in the window
+        :return: the same position in layout coordinates
+        :rtype: list
+        """
+        return [(pos[0] - self._offset[0]) / self.scale, (pos[1] - self._offset[1]) / self.scale]
+
+    def scaled(self, key: str, surface):
+        """
+        Returns a surface scaled to the window, scaling it only the first time it is drawn at this size
+        :param key: names the surface, such as a card's filename
+        :type key: str
+        :param surface: the surface at layout size
+        :return: the surface at window size
+        """
+        if self.scale == 1.0:
+            return surface
+        scaled = self._scaled.get(key)
+        if scaled is None:
+            CACHE_REQUESTS.inc(1, 'scaled', 'miss')
+            size = [max(1, round(surface.get_width() * self.scale)), max(1, round(surface.get_height() * self.scale))]
+            if surface.get_bitsize() < 24:
+                # The card GIFs are 8 bit and smoothscale only takes 24 or 32 bit surfaces
+                full = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+                full.blit(surface, [0, 0])
+                surface = full
+            scaled = self._scaled[key] = pygame.transform.smoothscale(surface, size)
+        else:
+            CACHE_REQUESTS.inc(1, 'scaled', 'hit')
+        return scaled
+
+    def font(self, size: int):
+        """
+        :param size: font size in layout coordinates
+        :type size: int
+        :return: the default font at that size scaled to the window, so text is rendered sharp instead of scaled
+        """
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = pygame.font.SysFont(None, max(1, round(size * self.scale)))
+        return font
+
+
+LAYOUT = Layout(DIMENSIONS)
 
 
 class Card(pygame.sprite.Sprite):
@@ -12,6 +149,8 @@ class Card(pygame.sprite.Sprite):
     Contains graphic image to draw card
     Contains rank and suit of card
     """
+    # Images already loaded, every new deck reuses them instead of reading the files again
+    _images = {}
 
     def __init__(self, filename: str):
         """
@@ -20,7 +159,8 @@ class Card(pygame.sprite.Sprite):
         :type filename: str
         """
         super(Card, self).__init__()
-        self.surf = pygame.image.load(filename)  # Uses the files from GUI folder
+        self._filename = filename
+        self.surf = Card._image(filename)  # Uses the files from GUI folder
         self.rect = self.surf.get_rect()
         self._rank = filename[0]
         # Using te name from the GUI Folder we can initialize the suit and rank of each card
@@ -31,6 +171,24 @@ class Card(pygame.sprite.Sprite):
         else:
 
             self._suit = filename[1]
+        # Card code used by the evaluator, -1 for the card back
+        self._code = cardCode(self._rank, self._suit) if self._rank.isdigit() else -1
+
+    @staticmethod
+    def _image(filename: str):
+        """
+        Loads a card image once, cards only ever blit it so every deck can share the same surface
+        :param filename: the card's image file in ASSETS
+        :type filename: str
+        :return: the image
+        """
+        image = Card._images.get(filename)
+        if image is None:
+            CACHE_REQUESTS.inc(1, 'image', 'miss')
+            image = Card._images[filename] = pygame.image.load(os.path.join(ASSETS, filename))
+        else:
+            CACHE_REQUESTS.inc(1, 'image', 'hit')
+        return image
 
     def getRank(self) -> str:
         """
@@ -48,15 +206,23 @@ class Card(pygame.sprite.Sprite):
         """
         return self._suit
 
+    def getCode(self) -> int:
+        """
+        returns the card code of a card
+        :return: the code evaluator functions use (0-51), -1 for the card back
+        :rtype: int
+        """
+        return self._code
+
     # Draws the card
     def displayCard(self, pos: list[int], screen):
         """
         Draws the card onto the screen
-        :param pos: position where to draw card
+        :param pos: position where to draw card, in layout coordinates
         :type pos: list[int]
         :param screen: where the card will be drawn on to
         """
-        screen.blit(self.surf, pos)
+        screen.blit(LAYOUT.scaled(self._filename, self.surf), LAYOUT.point(pos))
 
 
 class Deck:
@@ -88,6 +254,20 @@ class Deck:
         """
         return self._deck.pop()
 
+    def codes(self) -> bytes:
+        """
+        :return: card codes of the cards left, in the order they will be drawn from last to first
+        :rtype: bytes
+        """
+        return bytes([card.getCode() for card in self._deck])
+
+    def setCodes(self, codes):
+        """
+        Replaces the cards left with the ones codes() returned
+        :param codes: card codes
+        """
+        self._deck = [Card(codeToName(code) + '.gif') for code in codes]
+
 
 class CardGroup:
     """A subclass representing a list of cards such as a hand or the river"""
@@ -112,6 +292,20 @@ class CardGroup:
         """
         pass
 
+    def codes(self) -> bytes:
+        """
+        :return: card codes of the cards in the group, leaving out the card back
+        :rtype: bytes
+        """
+        return bytes([card.getCode() for card in self._cardGroup if card.getCode() >= 0])
+
+    def setCodes(self, codes):
+        """
+        Replaces the cards with the ones codes() returned
+        :param codes: card codes
+        """
+        self._cardGroup = [Card(codeToName(code) + '.gif') for code in codes]
+
 
 class River(CardGroup):
     """
@@ -187,9 +381,9 @@ class Player(CardGroup):
         :rtype: list[list]
         """
         hand = []
-        self._cardGroup += river._cardGroup
-        for i in range(len(self._cardGroup)):
-            hand.append([self._cardGroup[i].getRank(), self._cardGroup[i].getSuit()])
+        cards = self._cardGroup[:2] + river._cardGroup
+        for i in range(len(cards)):
+            hand.append([cards[i].getRank(), cards[i].getSuit()])
         return hand
 
 
@@ -199,15 +393,40 @@ class Bot(CardGroup):
     used for display, something exclusive to the Bot hand
     """
 
-    def __init__(self, deck: Deck):
+    def __init__(self, deck: Deck, strategy: Strategy = None):
         """
         Constructor method
         :param deck: deck of cards
         :type deck: Deck
+        :param strategy: decides the bot's actions, a default Strategy if None
+        :type strategy: Strategy
         """
         super().__init__(deck)
+        self._hole = [cardCode(card.getRank(), card.getSuit()) for card in self._cardGroup]
         self._cardGroup.append(Card('b.gif'))
         self._yCord = 100
+        self._strategy = strategy or Strategy()
+
+    def decide(self, river: River, facing: str, pot: int, amount: int = 0) -> str:
+        """
+        Asks the strategy what the bot does after the player acts
+        :param river: the river cards
+        :type river: River
+        :param facing: 'c' if the player checked, 'r' if the player raised
+        :type facing: str
+        :param pot: the pot including the player's raise
+        :type pot: int
+        :param amount: how much the player raised
+        :type amount: int
+        :return: 'c' to check or match, 'r' to raise the minimum wager, 'f' to fold
+        :rtype: str
+        """
+        start = time.perf_counter()
+        board = [cardCode(card.getRank(), card.getSuit()) for card in river._cardGroup]
+        action = self._strategy.decide(self._hole, board, facing, pot, amount)
+        EVALUATOR_SECONDS.observe(time.perf_counter() - start)
+        EVALUATOR_CALLS.inc(1, 'bot')
+        return action
 
     # Displays the back of a card
     def display(self, screen):
@@ -218,6 +437,16 @@ class Bot(CardGroup):
         for i in range(2):
             self._cardGroup[2].displayCard([self._starting + 100 * i, self._yCord], screen)
 
+    def setCodes(self, codes):
+        """
+        Replaces the hole cards with the ones codes() returned, keeping the card back
+        :param codes: card codes
+        """
+        back = self._cardGroup[2]
+        super().setCodes(codes)
+        self._hole = list(codes)
+        self._cardGroup.append(back)
+
     # End of game will need to display the card fronts
     def display1(self, screen):
         """
@@ -237,10 +466,9 @@ class Bot(CardGroup):
         :rtype: list[list]
         """
         hand = []
-        self._cardGroup += river._cardGroup
-        for i in range(len(self._cardGroup)):
-            if self._cardGroup[i].getRank() != 'b':
-                hand.append([self._cardGroup[i].getRank(), self._cardGroup[i].getSuit()])
+        cards = self._cardGroup[:2] + river._cardGroup
+        for i in range(len(cards)):
+            hand.append([cards[i].getRank(), cards[i].getSuit()])
         return hand
 
 
@@ -494,7 +722,7 @@ def highCard(handRank):
 def score(hand):
     """
     Scores the hand by checking one by one every possible score
-    :param hand: 2-d list containing suit and rank
+    :param hand: 2-d list containing suit and rank, any number of cards (variants.py scores Omaha and short deck)
     :type hand: list
     :return: returns which hand you got, as well as the highest ranking card(s) of that hand to settle tie breakers
     :rtype: list
@@ -502,7 +730,7 @@ def score(hand):
     suitList = ['c', 'd', 'h', 's']
     ranks = [0] * 14
     suits = [0] * 4
-    for i in range(7):
+    for i in range(len(hand)):
         hand[i][0] = int(hand[i][0])
         ranks[hand[i][0]] += 1
         suits[suitList.index(hand[i][1])] += 1
@@ -641,14 +869,56 @@ def checkHand(player, bot, river):
     :return: The bot score, player score, and the ending result
     :rtype: list
     """
-    pHand = player.addRiver(river).copy()
-    bHand = bot.addRiver(river).copy()
+    pHand = player.addRiver(river)
+    bHand = bot.addRiver(river)
+    return scoreHands(pHand, bHand, showdownResult(pHand, bHand)[1])
+
+
+def showdownResult(pHand, bHand) -> list:
+    """
+    Decides the showdown with the evaluator, which counts kickers, so the statistics and the end screen agree
+    :param pHand: the player's hand and the river, 2-d list containing rank and suit
+    :type pHand: list
+    :param bHand: the bot's hand and the river
+    :type bHand: list
+    :return: the winners for PlayerStats.endHand() and the result text for the end screen
+    :rtype: list
+    """
+    pValue = evaluate(handToCodes(pHand))
+    bValue = evaluate(handToCodes(bHand))
+    if pValue > bValue:
+        return [['Player'], 'YOU WIN']
+    if pValue < bValue:
+        return [['Bot'], 'YOU LOSE']
+    return [['Player', 'Bot'], 'IT IS A TIE']
+
+
+def scoreHands(pHand, bHand, result: str):
+    """
+    Same as checkHand() but from the lists addRiver() returns, so it can run away from the game objects
+    :param pHand: the player's hand and the river, 2-d list containing rank and suit
+    :type pHand: list
+    :param bHand: the bot's hand and the river
+    :type bHand: list
+    :param result: the ending result from showdownResult(), only the names of the hands are worked out here
+    :type result: str
+    :return: The bot score, player score, and the ending result
+    :rtype: list
+    """
     bScore = score(bHand)
     pScore = score(pHand)
-    result = (endText(bScore, pScore))
     return ['Player: ' + pScore[0], 'Bot: ' + bScore[0], result]
 
 
+def postJob(job):
+    """
+    Hands a finished background job to the frame loop as a JOB_DONE event
+    :param job: the finished job
+    :type job: Job
+    """
+    pygame.event.post(pygame.event.Event(JOB_DONE, job=job))
+
+
 class Text:
     """
     Used to handle all of the text that you will see on the game
@@ -666,21 +936,61 @@ class Text:
         self._WHITE = [255, 255, 255]
         self._RED = [255, 0, 0]
         self._screen = screen
-        self._smallFont = pygame.font.SysFont(None, 25)
-        self._medFont = pygame.font.SysFont(None, 50)
-        self._largeFont = pygame.font.SysFont(None, 70)
+        self.resize()
+
+    def resize(self):
+        """
+        Renders the fonts and the fixed text again at the layout's current scale
+        """
+        MinimumWager = self._minWager
+        # Text that changes between frames, such as the pot, rendered once per distinct string
+        self._rendered = {}
+        self._smallFont = LAYOUT.font(25)
+        self._medFont = LAYOUT.font(50)
+        self._largeFont = LAYOUT.font(70)
         self._minWTxt = self._smallFont.render('Minimum wager: $' + str(MinimumWager), True, self._WHITE)
         self._potTxt = self._medFont.render('POT: $' + str(MinimumWager + MinimumWager), True, self._WHITE)
         self._checkTxt = self._largeFont.render('CHECK', True, self._WHITE)
         self._raiseTxt = self._largeFont.render('RAISE', True, self._WHITE)
         self._foldTxt = self._largeFont.render('FOLD', True, self._WHITE)
         self._foldScreenTxt = self._largeFont.render('YOU FOLDED', True, self._RED)
+        self._botFoldScreenTxt = self._largeFont.render('BOT FOLDED', True, self._RED)
         self._playAgainTxt = self._medFont.render("Play again? (Press space)", True, self._WHITE)
         self._checkEventTxt = self._smallFont.render('You check, bot raises min. wager. ($' +
                                                      str(MinimumWager) + ')',
                                                      True, self._WHITE)
+        self._checkBackEventTxt = self._smallFont.render('You check, bot checks.', True, self._WHITE)
         self._raiseAmountTxt = self._largeFont.render('Amount: $', True, self._WHITE)
 
+    def _blit(self, surface, pos):
+        """
+        Draws rendered text at a position in layout coordinates
+        :param surface: the rendered text
+        :param pos: where to draw it
+        """
+        self._screen.blit(surface, LAYOUT.point(pos))
+
+    def _render(self, font, text: str, color):
+        """
+        Renders text, reusing the surface from an earlier frame when the same text was drawn before
+        :param font: one of the Text fonts
+        :param text: what to write
+        :type text: str
+        :param color: the text color
+        :return: the rendered text
+        """
+        key = (id(font), text, tuple(color))
+        surface = self._rendered.get(key)
+        if surface is None:
+            CACHE_REQUESTS.inc(1, 'text', 'miss')
+            if len(self._rendered) >= 256:
+                # Pots and raise amounts keep changing, start over rather than grow forever
+                self._rendered.clear()
+            surface = self._rendered[key] = font.render(text, True, color)
+        else:
+            CACHE_REQUESTS.inc(1, 'text', 'hit')
+        return surface
+
     def display(self, pot):
         """
         This function is the normal state of the game, meaning you are deciding on what to do
@@ -688,71 +998,79 @@ class Text:
         :type pot: int
         """
 
-        self._potTxt = self._medFont.render('POT: $' + str(pot), True, self._WHITE)
-        self._screen.blit(self._checkTxt, (80, 627))
-        self._screen.blit(self._raiseTxt, (362, 627))
-        self._screen.blit(self._foldTxt, (640, 627))
-        self._screen.blit(self._potTxt, (70, 30))
-        self._screen.blit(self._minWTxt, (642, 30))
+        self._potTxt = self._render(self._medFont, 'POT: $' + str(pot), self._WHITE)
+        self._blit(self._checkTxt, (80, 627))
+        self._blit(self._raiseTxt, (362, 627))
+        self._blit(self._foldTxt, (640, 627))
+        self._blit(self._potTxt, (70, 30))
+        self._blit(self._minWTxt, (642, 30))
 
-    def displayMessage(self, pot=0):
+    def displayMessage(self, pot=0, botChecked=False):
         """
         Text that pops up when you raise, also indicates that the bot matched your raise
         :param pot: bad naming, but it's the amount you raised too lazy to change now haha
+        :param botChecked: the bot checked behind instead of raising the minimum wager
         :return: displays the amount you raised and that the bot matched your raise
         """
-        if pot == 0:
-            self._screen.blit(self._checkEventTxt, (70, 67))
+        if botChecked:
+            self._blit(self._checkBackEventTxt, (70, 67))
+        elif pot == 0:
+            self._blit(self._checkEventTxt, (70, 67))
         else:
-            raiseEventTxt = self._smallFont.render('You raise, bot matches raise. ($' + str(pot) + ')', True,
-                                                   self._WHITE)
-            self._screen.blit(raiseEventTxt, (70, 67))
+            raiseEventTxt = self._render(self._smallFont, 'You raise, bot matches raise. ($' + str(pot) + ')',
+                                         self._WHITE)
+            self._blit(raiseEventTxt, (70, 67))
 
-    def display1(self, pot, player, bot, river):
+    def display1(self, pot, showdown=None):
         """
         Displays the end game screen showing who won and saying if you want to play again
         :param pot: Total pot
         :type pot: int
-        :param player: player hand
-        :type player: Player
-        :param bot: bot hand
-        :type bot: Bot
-        :param river: river cards
-        :type river: River
+        :param showdown: what checkHand returned for this hand, None if there was no showdown
+        :type showdown: list
         :return:
         """
-        if river.length() == 5:
-            pScore = checkHand(player, bot, river)[0]
-            botScore = checkHand(player, bot, river)[1]
-            result = checkHand(player, bot, river)[2]
-            playerScore = self._medFont.render(pScore, True, self._WHITE)
-            botScore = self._medFont.render(botScore, True, self._WHITE)
-            resultText = self._largeFont.render(result, True, self._WHITE)
-            self._screen.blit(playerScore, (70, 97))
-            self._screen.blit(botScore, (70, 132))
-            self._screen.blit(resultText, (270, 620))
-
-        self._potTxt = self._medFont.render('POT: $' + str(pot), True, self._WHITE)
-        self._screen.blit(self._potTxt, (70, 30))
-        self._screen.blit(self._minWTxt, (642, 30))
-        self._screen.blit(self._playAgainTxt, (220, 680))
+        if showdown is not None:
+            pScore, botScore, result = showdown
+            playerScore = self._render(self._medFont, pScore, self._WHITE)
+            botScore = self._render(self._medFont, botScore, self._WHITE)
+            resultText = self._render(self._largeFont, result, self._WHITE)
+            self._blit(playerScore, (70, 97))
+            self._blit(botScore, (70, 132))
+            self._blit(resultText, (270, 620))
+
+        self._potTxt = self._render(self._medFont, 'POT: $' + str(pot), self._WHITE)
+        self._blit(self._potTxt, (70, 30))
+        self._blit(self._minWTxt, (642, 30))
+        self._blit(self._playAgainTxt, (220, 680))
 
     def display2(self):
         """
         You get this text when you fold
         """
-        self._screen.blit(self._foldScreenTxt, (275, 623))
-        self._screen.blit(self._playAgainTxt, (220, 680))
+        self._blit(self._foldScreenTxt, (275, 623))
+        self._blit(self._playAgainTxt, (220, 680))
+
+    def display4(self, pot):
+        """
+        You get this text when the bot folds to your raise
+        :param pot: the pot you won
+        """
+        self._potTxt = self._render(self._medFont, 'POT: $' + str(pot), self._WHITE)
+        self._blit(self._potTxt, (70, 30))
+        self._blit(self._minWTxt, (642, 30))
+        self._blit(self._botFoldScreenTxt, (265, 623))
+        self._blit(self._playAgainTxt, (220, 680))
 
     def display3(self, pot):
         """
         This is used when you check and the bot raises the minimum wager
         :param pot: the pot in the game
         """
-        self._potTxt = self._medFont.render('POT: $' + str(pot), True, self._WHITE)
-        self._screen.blit(self._potTxt, (70, 30))
-        self._screen.blit(self._minWTxt, (642, 30))
-        self._screen.blit(self._raiseAmountTxt, (50, 627))
+        self._potTxt = self._render(self._medFont, 'POT: $' + str(pot), self._WHITE)
+        self._blit(self._potTxt, (70, 30))
+        self._blit(self._minWTxt, (642, 30))
+        self._blit(self._raiseAmountTxt, (50, 627))
 
     def raiseAmount(self, text):
         """
@@ -761,8 +1079,8 @@ class Text:
         :param text: the user inputted number
         :type text: string
         """
-        potTxt = self._largeFont.render(str(text), True, self._WHITE)
-        self._screen.blit(potTxt, (300, 626))
+        potTxt = self._render(self._largeFont, str(text), self._WHITE)
+        self._blit(potTxt, (300, 626))
 
 
 class Square:
@@ -774,11 +1092,11 @@ class Square:
         """
         Constructor method
         :param COLOR: The rgb values of a color
-        :param POS: position of the square
-        :param SIZE: size of the square
+        :param POS: position of the square, in layout coordinates
+        :param SIZE: size of the square, in layout coordinates
         :param screen: what the square will be drawn onto
         """
-        pygame.draw.rect(screen, COLOR, pygame.Rect(POS[0], POS[1], SIZE[0], SIZE[1]), 0, 3)
+        pygame.draw.rect(screen, COLOR, LAYOUT.rect(POS, SIZE), 0, max(1, round(3 * LAYOUT.scale)))
 
 
 class Background:
@@ -876,20 +1194,28 @@ class Game:
 
     # MINIMUM_WAGER = -20
     # MINIMUM_WAGER = 'A'
-    def __init__(self, screen):
+    # Middle of each button in layout coordinates, where act() points the mouse
+    BUTTON_CENTERS = {'c': [172, 650], 'r': [440, 650], 'f': [707, 650]}
+
+    def __init__(self, screen, statsPath: str = STATS_FILE):
         """
         Default constructor
         :param screen: main drawing screen
+        :param statsPath: where the player statistics are kept, None to only keep them in memory
+        :type statsPath: str
         """
+        # Built here rather than by the bot's first decision, which runs between frames
+        evaluator.tables()
         self._pot = Game.MINIMUM_WAGER + Game.MINIMUM_WAGER
         self._screen = screen
         self._BLACK = [0, 0, 0]
-        self._state = 0  # 0 is normal 1 is game end 2 is fold end 3 is raising
+        self._state = 0  # 0 is normal 1 is game end 2 is fold end 3 is raising 4 is bot fold end
         self._deck = Deck()
         self._background = Background(screen)
         self._button = Buttons(screen)
+        self._strategy = Strategy(POLICY_FILE if os.path.exists(POLICY_FILE) else None)
         self._player = Player(self._deck)
-        self._bot = Bot(self._deck)
+        self._bot = Bot(self._deck, self._strategy)
         self._river = River(self._deck)
         self._mousePos = [0, 0]
         self._text = Text(screen, Game.MINIMUM_WAGER)
@@ -898,18 +1224,25 @@ class Game:
         self._raising = False
         self._raisePrompt = ''
         self._tempHoldRaise = ''
+        self._showdown = None
+        self._stats = PlayerStats(statsPath)
+        self._stats.startHand(['Player', 'Bot'])
+        # Scoring and analysis run here so a slow one never holds up a frame
+        self._jobs = JobPool(postJob)
 
     def display(self):
         """
         displays everything to the game keeping track of what buttons were pressed
         """
         self._screen.fill(self._BLACK)
-        self._mousePos = pygame.mouse.get_pos()
+        self._mousePos = LAYOUT.toLayout(pygame.mouse.get_pos())
         self._background.display()
         self._button.updateMousePos(self._mousePos)
 
         if self._mostRecentButton == 1:
             self._text.displayMessage()
+        if self._mostRecentButton == 3:
+            self._text.displayMessage(botChecked=True)
         self._player.display(self._screen)
         self._bot.display(self._screen)
         self._river.display(self._screen)
@@ -922,9 +1255,11 @@ class Game:
 
         if self._state in [1, 2]:
             self._bot.display1(self._screen)
-            self._text.display1(self._pot, self._player, self._bot, self._river)
+            self._text.display1(self._pot, self._showdown)
             if self._state == 2:
                 self._text.display2()
+        if self._state == 4:
+            self._text.display4(self._pot)
         if self._state == 3:
             self._text.display3(self._pot)
             self._text.raiseAmount(self._raisePrompt)
@@ -935,15 +1270,20 @@ class Game:
         """
         if self._state == 0:
             if self._button.update() == 'c':
-                self._mostRecentButton = 1
-                self._pot += Game.MINIMUM_WAGER
-                # self._pot += "a"
-                # self._pot += -30
+                self._stats.recordAction('Player', 'c')
+                botAction = self._bot.decide(self._river, 'c', self._pot)
+                self._stats.recordAction('Bot', botAction)
+                if botAction == 'r':
+                    self._mostRecentButton = 1
+                    self._pot += Game.MINIMUM_WAGER
+                    # self._pot += "a"
+                    # self._pot += -30
+                else:
+                    self._mostRecentButton = 3
 
                 self._river.newTurn(self._deck, self._screen)
                 if self._river.length() == 5:
-                    self._quit = True
-                    self._state = 1
+                    self._endShowdown()
 
             elif self._button.update() == 'r':
                 self._state = 3
@@ -953,6 +1293,106 @@ class Game:
                 self._mostRecentButton = 0
                 self._quit = True
                 self._state = 2
+                self._stats.recordAction('Player', 'f')
+                self._stats.endHand(self._pot, ['Bot'], False)
+                HANDS_COMPLETED.inc(1, 'fold')
+
+    def _endShowdown(self):
+        """
+        Ends the hand once the river has 5 cards, the hands are scored by a background job
+        """
+        self._quit = True
+        self._state = 1
+        pHand = self._player.addRiver(self._river)
+        bHand = self._bot.addRiver(self._river)
+        # Who won is known right away from the fast evaluator, so the hand is recorded even when the player moves
+        # on before the showdown text comes back, and the text shows the same result
+        winners, result = showdownResult(pHand, bHand)
+        self._stats.endHand(self._pot, winners, True)
+        HANDS_COMPLETED.inc(1, 'showdown')
+        self._jobs.submit('showdown', scoreHands, pHand, bHand, result)
+
+    def jobDone(self, job):
+        """
+        Takes in the result of a background job of this hand
+        :param job: the job a JOB_DONE event carries
+        :type job: Job
+        """
+        # A result can already be waiting in the event queue when the player starts the next hand
+        if job.hand != self._jobs.hand():
+            return
+        if job.error is not None:
+            raise job.error
+        if job.name == 'showdown':
+            self._showdownScored(job.result, job.seconds)
+
+    def _showdownScored(self, showdown, seconds):
+        """
+        Shows the scored showdown, the hand itself was already recorded by _endShowdown()
+        :param showdown: what scoreHands() returned
+        :type showdown: list
+        :param seconds: how long scoring took
+        :type seconds: float
+        """
+        self._showdown = showdown
+        EVALUATOR_SECONDS.observe(seconds)
+        EVALUATOR_CALLS.inc(1, 'showdown')
+
+    def snapshot(self) -> bytes:
+        """
+        Packs everything needed to carry on with this hand into a small binary blob, the cards as codes
+        :return: the snapshot
+        :rtype: bytes
+        """
+        river = self._river.codes()
+        deck = self._deck.codes()
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self._state, self._pot,
+                                      self._mostRecentButton, self._quit, self._raisePrompt.encode(),
+                                      self._tempHoldRaise.encode(), len(river), len(deck))
+        return header + self._player.codes() + self._bot.codes() + river + deck
+
+    def restore(self, snapshot: bytes):
+        """
+        Continues the hand a snapshot() was taken of, possibly in another process
+        :param snapshot: blob from snapshot()
+        :type snapshot: bytes
+        """
+        magic, version, state, pot, mostRecentButton, quit, raisePrompt, tempHoldRaise, riverLength, deckLength = \
+            SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError('Not a game snapshot of version ' + str(SNAPSHOT_VERSION))
+        codes = snapshot[SNAPSHOT_HEADER.size:]
+        if len(codes) != 4 + riverLength + deckLength:
+            raise ValueError('Game snapshot is ' + str(len(snapshot)) + ' bytes, expected ' +
+                             str(SNAPSHOT_HEADER.size + 4 + riverLength + deckLength))
+        self._state = state
+        self._pot = pot
+        self._mostRecentButton = mostRecentButton
+        self._quit = quit
+        self._raisePrompt = raisePrompt.rstrip(b'\0').decode()
+        self._tempHoldRaise = tempHoldRaise.rstrip(b'\0').decode()
+        self._player.setCodes(codes[0:2])
+        self._bot.setCodes(codes[2:4])
+        self._river.setCodes(codes[4:4 + riverLength])
+        self._deck.setCodes(codes[4 + riverLength:])
+        self._jobs.newHand()
+        # The end screen text is scored again rather than stored
+        self._showdown = checkHand(self._player, self._bot, self._river) if state == 1 else None
+
+    def resize(self, size):
+        """
+        Scales the game to a new window size
+        :param size: width and height of the window
+        """
+        LAYOUT.resize(size)
+        self._text.resize()
+
+    def close(self):
+        """
+        Stops the background jobs and saves the statistics when the window closes
+        """
+        self._jobs.close()
+        self._stats.flush()
 
     def quit(self):
         """
@@ -971,10 +1411,43 @@ class Game:
         self._deck = Deck()
         self._button = Buttons(self._screen)
         self._player = Player(self._deck)
-        self._bot = Bot(self._deck)
+        self._bot = Bot(self._deck, self._strategy)
         self._river = River(self._deck)
         self._raisePrompt = ''
         self._tempHoldRaise = ''
+        self._showdown = None
+        self._stats.startHand(['Player', 'Bot'])
+        # Anything still working on the last hand is no longer wanted
+        self._jobs.newHand()
+
+    def act(self, action: str, amount: int = 0):
+        """
+        Plays an action as if the player had clicked and typed it, for replays and scripted hands
+        :param action: 'c' to check, 'r' to raise, 'f' to fold
+        :type action: str
+        :param amount: how much to raise
+        :type amount: int
+        """
+        self._button.updateMousePos(Game.BUTTON_CENTERS[action])
+        self.click()
+        if action == 'r':
+            for digit in str(amount):
+                self.raiseEvent(pygame.event.Event(pygame.KEYUP, key=pygame.K_0 + int(digit)))
+            self.raiseEvent(pygame.event.Event(pygame.KEYUP, key=pygame.K_RETURN))
+
+    def state(self) -> int:
+        """
+        :return: 0 is normal 1 is game end 2 is fold end 3 is raising 4 is bot fold end
+        :rtype: int
+        """
+        return self._state
+
+    def showdownPending(self) -> bool:
+        """
+        :return: whether the hand went to showdown and is still being scored
+        :rtype: bool
+        """
+        return self._state == 1 and self._showdown is None
 
     def raising(self):
         """
@@ -1001,6 +1474,19 @@ class Game:
         if event.key == pygame.K_RETURN:
             if self._raisePrompt != '':
                 if Game.MINIMUM_WAGER <= int(self._raisePrompt) <= self._pot:
+                    amount = int(self._raisePrompt)
+                    self._stats.recordAction('Player', 'r')
+                    botAction = self._bot.decide(self._river, 'r', self._pot + amount, amount)
+                    self._stats.recordAction('Bot', botAction, True)
+                    if botAction == 'f':
+                        self._pot += amount
+                        self._raisePrompt = ''
+                        self._mostRecentButton = 0
+                        self._quit = True
+                        self._state = 4
+                        self._stats.endHand(self._pot, ['Player'], False)
+                        HANDS_COMPLETED.inc(1, 'botFold')
+                        return
                     self._pot += int(self._raisePrompt) + int(self._raisePrompt)
                     self._state = 0
                     self._mostRecentButton = 2
@@ -1008,8 +1494,7 @@ class Game:
                     self._raisePrompt = ''
                     self._river.newTurn(self._deck, self._screen)
                     if self._river.length() == 5:
-                        self._quit = True
-                        self._state = 1
+                        self._endShowdown()
 
 
 if __name__ == "__main__":
@@ -1018,26 +1503,40 @@ if __name__ == "__main__":
         Creates the screen and uses the game class to create all the variables needed to play
         :return:
         """
-        screen = pygame.display.set_mode(DIMENSIONS)
+        if METRICS_PORT:
+            metrics.serve(int(METRICS_PORT))
+        screen = pygame.display.set_mode(DIMENSIONS, pygame.RESIZABLE)
         running = True
         clock = pygame.time.Clock()
         s = Game(screen)
-        while running:
-            s.display()
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                if event.type == pygame.MOUSEBUTTONUP:
-                    s.click()
-                if event.type == pygame.KEYUP:
-                    if s.raising():
-                        s.raiseEvent(event)
-
-                    if event.key == pygame.K_SPACE and s.quit():
-                        s.newGame()
-
-            pygame.display.flip()
-            clock.tick(60)
+        try:
+            while running:
+                start = time.perf_counter()
+                s.display()
+                events = pygame.event.get()
+                EVENT_QUEUE_DEPTH.set(len(events))
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        running = False
+                    if event.type == JOB_DONE:
+                        s.jobDone(event.job)
+                    if event.type == pygame.VIDEORESIZE:
+                        s.resize(event.size)
+                    if event.type == pygame.MOUSEBUTTONUP:
+                        s.click()
+                    if event.type == pygame.KEYUP:
+                        if s.raising():
+                            s.raiseEvent(event)
+
+                        if event.key == pygame.K_SPACE and s.quit():
+                            s.newGame()
+
+                pygame.display.flip()
+                FRAME_SECONDS.observe(time.perf_counter() - start)
+                clock.tick(60)
+        finally:
+            # Hands played since the last periodic save are kept even when the loop dies
+            s.close()
 
 
     main()
@@ -0,0 +1,315 @@
+"""
+In process metrics with a local HTTP endpoint in the Prometheus text exposition format
+Metrics are plain counters kept in this process, recording one is a few adds under a lock, and nothing is served
+until serve() is called
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the default histogram buckets, from 10 µs to 1 s
+DEFAULT_BUCKETS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0]
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99]
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _number(value) -> str:
+    """
+    :return: a sample value the way the exposition format writes it
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _labels(names, values) -> str:
+    """
+    :return: '{name="value",...}' or '' when there are no labels
+    """
+    pairs = [name + '="' + str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') + '"'
+             for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """
+    Base of every metric, one value per combination of label values
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelNames=()):
+        """
+        Constructor method
+        :param name: metric name, such as 'texasholdem_hands_completed_total'
+        :type name: str
+        :param help: one line description
+        :type help: str
+        :param labelNames: names of the labels every sample carries
+        """
+        self.name = name
+        self.help = help
+        self.labelNames = tuple(labelNames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _lines(self) -> list:
+        """
+        :return: the sample lines of this metric, without HELP and TYPE
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return [self.name + _labels(self.labelNames, key) + ' ' + _number(value) for key, value in values]
+
+    def render(self) -> str:
+        """
+        :return: this metric in the exposition format
+        :rtype: str
+        """
+        lines = ['# HELP ' + self.name + ' ' + self.help, '# TYPE ' + self.name + ' ' + self.kind]
+        return '\n'.join(lines + self._lines()) + '\n'
+
+
+class Counter(Metric):
+    """
+    A count that only goes up
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        """
+        :param amount: how much to add
+        :param labels: label values in the order of labelNames
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """
+        :return: the current count for these label values
+        """
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down
+    """
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        """
+        :param value: the new value
+        :param labels: label values in the order of labelNames
+        """
+        self._values[labels] = value
+
+    def value(self, *labels):
+        """
+        :return: the current value for these label values
+        """
+        return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    """
+    Counts observations into fixed buckets, cheap enough to record every call
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets=None):
+        """
+        Constructor method
+        :param name: metric name
+        :type name: str
+        :param help: one line description
+        :type help: str
+        :param buckets: increasing upper bounds, DEFAULT_BUCKETS when None
+        """
+        super().__init__(name, help)
+        self.buckets = list(buckets or DEFAULT_BUCKETS)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        """
+        :param value: the observation, such as a latency in seconds
+        :type value: float
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def count(self) -> int:
+        """
+        :return: how many observations were recorded
+        :rtype: int
+        """
+        return sum(self._counts)
+
+    def _lines(self) -> list:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets + [float('inf')], counts):
+            running += count
+            lines.append(self.name + '_bucket{le="' + _number(float(bound)) + '"} ' + str(running))
+        lines.append(self.name + '_sum ' + _number(total))
+        lines.append(self.name + '_count ' + str(running))
+        return lines
+
+
+class Summary(Metric):
+    """
+    Quantiles over the most recent observations, kept in a ring of fixed size
+    """
+    kind = 'summary'
+
+    def __init__(self, name: str, help: str, window: int = 600, quantiles=None):
+        """
+        Constructor method
+        :param name: metric name
+        :type name: str
+        :param help: one line description
+        :type help: str
+        :param window: how many recent observations the quantiles are taken over
+        :type window: int
+        :param quantiles: quantiles to report, DEFAULT_QUANTILES when None
+        """
+        super().__init__(name, help)
+        self.quantiles = list(quantiles or DEFAULT_QUANTILES)
+        self._ring = [0.0] * window
+        self._next = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        """
+        :param value: the observation, such as a frame time in seconds
+        :type value: float
+        """
+        with self._lock:
+            self._ring[self._next] = value
+            self._next = (self._next + 1) % len(self._ring)
+            self._count += 1
+            self._sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: between 0 and 1
+        :type q: float
+        :return: the q quantile of the recent observations, 0 before any
+        :rtype: float
+        """
+        with self._lock:
+            recent = sorted(self._ring[:min(self._count, len(self._ring))])
+        if not recent:
+            return 0.0
+        return recent[min(int(q * len(recent)), len(recent) - 1)]
+
+    def _lines(self) -> list:
+        lines = [self.name + '{quantile="' + _number(q) + '"} ' + _number(self.quantile(q)) for q in self.quantiles]
+        lines.append(self.name + '_sum ' + _number(self._sum))
+        lines.append(self.name + '_count ' + str(self._count))
+        return lines
+
+
+class Registry:
+    """
+    The metrics a process exposes, in the order they were registered
+    """
+
+    def __init__(self):
+        """
+        Constructor method
+        """
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric, or returns the one already registered under its name
+        :param metric: the new metric
+        :type metric: Metric
+        :return: the registered metric
+        :rtype: Metric
+        """
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelNames=()) -> Counter:
+        """
+        :return: a new Counter, or the one already registered under this name
+        :rtype: Counter
+        """
+        return self.register(Counter(name, help, labelNames))
+
+    def gauge(self, name: str, help: str, labelNames=()) -> Gauge:
+        """
+        :return: a new Gauge, or the one already registered under this name
+        :rtype: Gauge
+        """
+        return self.register(Gauge(name, help, labelNames))
+
+    def histogram(self, name: str, help: str, buckets=None) -> Histogram:
+        """
+        :return: a new Histogram, or the one already registered under this name
+        :rtype: Histogram
+        """
+        return self.register(Histogram(name, help, buckets))
+
+    def summary(self, name: str, help: str, window: int = 600, quantiles=None) -> Summary:
+        """
+        :return: a new Summary, or the one already registered under this name
+        :rtype: Summary
+        """
+        return self.register(Summary(name, help, window, quantiles))
+
+    def render(self) -> str:
+        """
+        :return: every metric in the Prometheus text exposition format
+        :rtype: str
+        """
+        return ''.join(metric.render() for metric in list(self._metrics.values()))
+
+
+# Registry the game records into
+REGISTRY = Registry()
+
+
+def serve(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serves a registry on http://host:port/metrics from a daemon thread
+    :param port: port to listen on, 0 for any free port
+    :type port: int
+    :param host: address to bind, the loopback address by default so only the kiosk itself can scrape it
+    :type host: str
+    :param registry: metrics to serve
+    :type registry: Registry
+    :return: the running server, shutdown() stops it
+    :rtype: ThreadingHTTPServer
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ['/', '/metrics']:
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # Scrapes every few seconds would otherwise flood the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
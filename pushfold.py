@@ -0,0 +1,415 @@
+"""
+Heads up push or fold equilibrium charts for short stacks
+Both hands post Game.MINIMUM_WAGER, the first to act moves all in or folds and the other calls or folds
+Hands are reduced to the 169 starting hand classes, the exact class against class equities and combo counts are
+worked out once and cached, then CFR+ over those flat matrices finds the equilibrium for a grid of stack depths
+"""
+import argparse
+import bisect
+import contextlib
+import itertools
+import json
+import math
+import operator
+import os
+import random
+import time
+from array import array
+
+from cfr import MINIMUM_WAGER, regretMatching
+from evaluator import VALUE, evaluate
+from ranges import RANK_LETTERS, handClassCombos
+from sharedtables import SharedTables, sharedPool
+
+EQUITY_FILE = 'pushfold.bin'
+CHART_FILE = 'pushfold.json'
+# Bumped whenever the equity matrix changes, cached matrices and charts of another version are rebuilt
+MATRIX_VERSION = 2
+# Stack depths in multiples of the minimum wager the charts are solved for, others are interpolated
+STACK_GRID = [1.0 + 0.5 * i for i in range(18)] + [float(depth) for depth in range(10, 31)]
+
+
+def _classes() -> list:
+    """
+    :return: [high value, low value, kind] of the 169 hand classes, strongest ranks first
+    """
+    classes = []
+    for high in range(12, -1, -1):
+        for low in range(high, -1, -1):
+            if high == low:
+                classes.append([high, low, ''])
+            else:
+                classes.append([high, low, 's'])
+                classes.append([high, low, 'o'])
+    return classes
+
+
+CLASSES = _classes()
+CLASS_NAMES = [RANK_LETTERS[high] + RANK_LETTERS[low] + kind for high, low, kind in CLASSES]
+_CLASS_INDEX = {tuple(handClass): i for i, handClass in enumerate(CLASSES)}
+CLASS_COMBOS = [handClassCombos(high, low, kind) for high, low, kind in CLASSES]
+
+
+def classIndex(hole) -> int:
+    """
+    :param hole: 2 hole cards as card codes
+    :return: index of the hand's class in CLASSES
+    :rtype: int
+    """
+    first, second = VALUE[hole[0]], VALUE[hole[1]]
+    high, low = max(first, second), min(first, second)
+    kind = '' if high == low else 's' if hole[0] & 3 == hole[1] & 3 else 'o'
+    return _CLASS_INDEX[(high, low, kind)]
+
+
+# Every 2 card hand as card codes and the class it belongs to
+HANDS = list(itertools.combinations(range(52), 2))
+HAND_CLASSES = [classIndex(hand) for hand in HANDS]
+# Boards that can come after any two hands that do not share a card
+BOARDS_PER_PAIR = math.comb(48, 5)
+# How the 5 board cards can be spread over the 4 suits, most cards in the first suit
+SUIT_SHAPES = [[5, 0, 0, 0], [4, 1, 0, 0], [3, 2, 0, 0], [3, 1, 1, 0], [2, 2, 1, 0], [2, 1, 1, 1]]
+
+
+def _suitRanks(shape: list, chosen: list):
+    """
+    :return: generator of [board codes, boards it stands for] for every way of giving each suit its ranks,
+        suits with the same number of cards take their ranks in decreasing order so each board comes up once
+    """
+    suit = len(chosen)
+    if suit == 4:
+        # Renaming suits gives 24 boards, fewer when suits hold the same ranks
+        orbit = 24
+        for ranks in set(chosen):
+            orbit //= math.factorial(chosen.count(ranks))
+        yield [[(value + 1) % 13 * 4 + s for s, values in enumerate(chosen) for value in values], orbit]
+        return
+    for values in itertools.combinations(range(13), shape[suit]):
+        if suit and shape[suit] == shape[suit - 1] and values > chosen[-1]:
+            continue
+        yield from _suitRanks(shape, chosen + [values])
+
+
+def boardClasses() -> list:
+    """
+    Hand classes do not care which suit is which, so every board only differs from 23 others by renaming suits
+    :return: [board codes, how many boards it stands for] with one board of every such set
+    :rtype: list
+    """
+    return [board for shape in SUIT_SHAPES for board in _suitRanks(shape, [])]
+
+
+def _boardWins(boards) -> array:
+    """
+    Worker side of equityMatrix(), adds up for every class pair the showdowns the first class wins over a share
+    of the boards, a tie counting half
+    :param boards: [board codes, boards it stands for] pairs
+    :return: the weighted wins, 169 * 169 and indexed [hero * 169 + villain]
+    """
+    size = len(CLASSES)
+    byWeight = {}
+    for board, weight in boards:
+        wins = byWeight.setdefault(weight, [[0.0] * size for _ in range(size)])
+        boardSet = set(board)
+        live = [h for h, hand in enumerate(HANDS) if hand[0] not in boardSet and hand[1] not in boardSet]
+        values = [evaluate(list(HANDS[h]) + board) for h in live]
+        order = sorted(range(len(live)), key=values.__getitem__)
+        classes = [HAND_CLASSES[h] for h in live]
+        # Every hand beats the ones below it and ties the ones with the same value, itself included
+        below = [0.0] * size
+        start = 0
+        while start < len(order):
+            end = start
+            tied = [0.0] * size
+            while end < len(order) and values[order[end]] == values[order[start]]:
+                tied[classes[order[end]]] += 0.5
+                end += 1
+            beaten = list(map(operator.add, below, tied))
+            for position in order[start:end]:
+                row = wins[classes[position]]
+                row[:] = map(operator.add, row, beaten)
+                row[classes[position]] -= 0.5
+            below = [count + 2.0 * half for count, half in zip(below, tied)]
+            start = end
+        # Hands sharing a card never meet, take their showdowns back out card by card
+        byCard = {}
+        for position in order:
+            for card in HANDS[live[position]]:
+                byCard.setdefault(card, []).append(position)
+        for positions in byCard.values():
+            for k in range(1, len(positions)):
+                a = positions[k]
+                row = wins[classes[a]]
+                for b in positions[:k]:
+                    if values[b] < values[a]:
+                        row[classes[b]] -= 1.0
+                    else:
+                        row[classes[b]] -= 0.5
+                        wins[classes[b]][classes[a]] -= 0.5
+    total = array('d', [0.0] * size * size)
+    for weight, wins in byWeight.items():
+        for i, row in enumerate(wins):
+            for j, value in enumerate(row):
+                total[i * size + j] += weight * value
+    return total
+
+
+def equityMatrix(workers: int = None, chunks: int = 256) -> dict:
+    """
+    Exact equity of every class against every class, over every pair of hands and every board, with how many
+    combo pairs of the two do not share a card
+    Each board evaluates the 1081 hands it leaves once and ranks them, which settles every class pair on that
+    board together, and only one board of each suit renaming is dealt, so the build is long but is done once and
+    cached
+    :param workers: processes to work with, None for one per CPU
+    :type workers: int
+    :param chunks: how many pieces the boards are split into
+    :type chunks: int
+    :return: {'equity': array, 'weight': array}, both 169 * 169 and indexed [hero * 169 + villain]
+    :rtype: dict
+    """
+    size = len(CLASSES)
+    boards = boardClasses()
+    tasks = [boards[i::chunks] for i in range(chunks)]
+    workers = workers or os.cpu_count() or 1
+    wins = array('d', [0.0] * size * size)
+    with sharedPool(workers) if workers > 1 else contextlib.nullcontext() as pool:
+        for part in map(_boardWins, tasks) if pool is None else pool.imap_unordered(_boardWins, tasks):
+            wins = array('d', map(operator.add, wins, part))
+    weight = array('d', [0.0] * size * size)
+    for i in range(size):
+        for j in range(size):
+            weight[i * size + j] = sum(1 for a in CLASS_COMBOS[i] for b in CLASS_COMBOS[j] if not set(a) & set(b))
+    equity = array('d', [wins[k] / (weight[k] * BOARDS_PER_PAIR) if weight[k] else 0.5 for k in range(size * size)])
+    return {'equity': equity, 'weight': weight}
+
+
+def _payoffs(matrix: dict, stack: float) -> list:
+    """
+    :return: combo pair counts by row, their totals, and the pusher's and the caller's showdown winnings
+        weighted by combo pairs, indexed [pusher][caller] and [caller][pusher]
+    """
+    size = len(CLASSES)
+    weight = matrix['weight']
+    rows = [list(weight[i * size:(i + 1) * size]) for i in range(size)]
+    totals = [sum(row) for row in rows]
+    showdown = [[count * stack * (2.0 * matrix['equity'][i * size + j] - 1.0) for j, count in enumerate(rows[i])]
+                for i in range(size)]
+    callerShowdown = [[-showdown[i][j] for i in range(size)] for j in range(size)]
+    return [rows, totals, showdown, callerShowdown]
+
+
+def _pushValues(payoffs: list, call) -> list:
+    """
+    :return: what each pushing class wins against a calling strategy, weighted by its combo pairs
+    """
+    rows, totals, showdown, callerShowdown = payoffs
+    # The blind is won whenever the caller folds, the stacks are at stake whenever it calls
+    return [totals[i] - sum(map(operator.mul, rows[i], call)) + sum(map(operator.mul, showdown[i], call))
+            for i in range(len(rows))]
+
+
+def _callValues(payoffs: list, push) -> list:
+    """
+    :return: what each calling class wins by calling a pushing strategy, and how often it gets pushed into,
+        both weighted by combo pairs
+    """
+    rows, totals, showdown, callerShowdown = payoffs
+    return [[sum(map(operator.mul, callerShowdown[j], push)) for j in range(len(rows))],
+            [sum(map(operator.mul, rows[j], push)) for j in range(len(rows))]]
+
+
+def exploitability(payoffs: list, push, call) -> float:
+    """
+    :param payoffs: result of _payoffs()
+    :param push: probability per class of moving all in
+    :param call: probability per class of calling
+    :return: how much the two sides together could win per hand by best responding, in minimum wagers
+    :rtype: float
+    """
+    totals = payoffs[1]
+    pushValues = _pushValues(payoffs, call)
+    callValues, reached = _callValues(payoffs, push)
+    # Folding always loses the 1 posted, so acting is worth value + weight over folding
+    gain = sum(max(0.0, value + total) - p * (value + total) for value, total, p in zip(pushValues, totals, push))
+    gain += sum(max(0.0, value + weight) - c * (value + weight) for value, weight, c in zip(callValues, reached, call))
+    return gain / sum(totals)
+
+
+def _addRegrets(regrets: list, act: float, foldValue: float, actValue: float):
+    """
+    Adds one iteration's regrets for folding and acting, floored at zero (CFR+)
+    """
+    value = act * actValue + (1.0 - act) * foldValue
+    regrets[0] = max(0.0, regrets[0] + foldValue - value)
+    regrets[1] = max(0.0, regrets[1] + actValue - value)
+
+
+def solve(matrix: dict, stack: float, iterations: int = 1000, tolerance: float = 0.001) -> dict:
+    """
+    CFR+ over the push or fold game for one stack depth, with both sides updated in turn and the average
+    strategies weighted by iteration
+    Payoffs are in multiples of the minimum wager: folding loses the 1 posted, stealing wins it and a call puts
+    the whole stack at stake
+    :param matrix: result of equityMatrix()
+    :type matrix: dict
+    :param stack: chips each side starts the hand with, in multiples of the minimum wager
+    :type stack: float
+    :param iterations: most iterations to run
+    :type iterations: int
+    :param tolerance: stop once neither side can win more than this by deviating
+    :type tolerance: float
+    :return: {'push': probability per class, 'call': probability per class, 'exploitability': float,
+        'iterations': int}
+    :rtype: dict
+    """
+    payoffs = _payoffs(matrix, stack)
+    totals = payoffs[1]
+    size = len(CLASSES)
+    # [fold, act] regrets per class
+    pushRegrets = [[0.0, 0.0] for _ in range(size)]
+    callRegrets = [[0.0, 0.0] for _ in range(size)]
+    push = [0.5] * size
+    call = [0.5] * size
+    pushSums = [0.0] * size
+    callSums = [0.0] * size
+    weights = 0
+    averagePush = push
+    averageCall = call
+    distance = float('inf')
+    rounds = 0
+    for rounds in range(1, iterations + 1):
+        values = _pushValues(payoffs, call)
+        for i in range(size):
+            _addRegrets(pushRegrets[i], push[i], -totals[i], values[i])
+        push = [regretMatching(regrets)[1] for regrets in pushRegrets]
+        values, reached = _callValues(payoffs, push)
+        for j in range(size):
+            _addRegrets(callRegrets[j], call[j], -reached[j], values[j])
+        call = [regretMatching(regrets)[1] for regrets in callRegrets]
+        pushSums = [total + rounds * p for total, p in zip(pushSums, push)]
+        callSums = [total + rounds * c for total, c in zip(callSums, call)]
+        weights += rounds
+        if rounds % 10 == 0 or rounds == iterations:
+            averagePush = [total / weights for total in pushSums]
+            averageCall = [total / weights for total in callSums]
+            distance = exploitability(payoffs, averagePush, averageCall)
+            if distance < tolerance:
+                break
+    return {'push': averagePush, 'call': averageCall, 'exploitability': distance, 'iterations': rounds}
+
+
+class PushFold:
+    """
+    Push or fold charts for a fixed grid of stack depths, solved once and cached in memory and on disk
+    """
+
+    def __init__(self, path: str = EQUITY_FILE, chartPath: str = CHART_FILE, workers: int = None):
+        """
+        Constructor method, builds whatever is not cached yet, the equity matrix takes a long while the first time
+        :param path: file caching the equity matrix, built and written when missing, None to not cache it
+        :type path: str
+        :param chartPath: JSON file caching the solved charts, None to only keep them in memory
+        :type chartPath: str
+        :param workers: processes used to build the matrix, None for one per CPU
+        :type workers: int
+        """
+        self._shared = None
+        self._matrix = None
+        if path is not None and os.path.exists(path):
+            self._shared = SharedTables.attach(path=path)
+            version = self._shared.tables.get('version')
+            if version is not None and version[0] == MATRIX_VERSION:
+                self._matrix = self._shared.tables
+            else:
+                self._shared.close()
+                self._shared = None
+        if self._matrix is None:
+            self._matrix = equityMatrix(workers)
+            if path is not None:
+                tables = dict(self._matrix, version=array('i', [MATRIX_VERSION]))
+                SharedTables.publish(tables, path=path).close()
+        charts = {}
+        if chartPath is not None and os.path.exists(chartPath):
+            with open(chartPath) as file:
+                charts = json.load(file)
+        if charts.get('version') != MATRIX_VERSION:
+            charts = {}
+        self._charts = {str(depth): charts.get(str(depth)) or solve(self._matrix, depth) for depth in STACK_GRID}
+        if chartPath is not None and len(charts) != len(self._charts) + 1:
+            with open(chartPath + '.tmp', 'w') as file:
+                json.dump(dict(self._charts, version=MATRIX_VERSION), file)
+            os.replace(chartPath + '.tmp', chartPath)
+
+    def chart(self, stack: float) -> dict:
+        """
+        :param stack: effective stack in multiples of the minimum wager
+        :type stack: float
+        :return: {'push': probability per class, 'call': probability per class, 'exploitability': float} of the
+            grid depth, or mixed linearly from the two grid depths around it, clamped to the ends of STACK_GRID
+        :rtype: dict
+        """
+        stack = min(max(stack, STACK_GRID[0]), STACK_GRID[-1])
+        upper = bisect.bisect_left(STACK_GRID, stack)
+        high = self._charts[str(STACK_GRID[upper])]
+        if STACK_GRID[upper] == stack:
+            return high
+        low = self._charts[str(STACK_GRID[upper - 1])]
+        share = (stack - STACK_GRID[upper - 1]) / (STACK_GRID[upper] - STACK_GRID[upper - 1])
+        return {'push': [a + share * (b - a) for a, b in zip(low['push'], high['push'])],
+                'call': [a + share * (b - a) for a, b in zip(low['call'], high['call'])],
+                'exploitability': max(low['exploitability'], high['exploitability'])}
+
+    def decide(self, hole, stack: float, facingPush: bool = False, rng=None) -> str:
+        """
+        :param hole: 2 hole cards as card codes
+        :param stack: effective stack in chips
+        :type stack: float
+        :param facingPush: whether the other side already moved all in
+        :type facingPush: bool
+        :param rng: random.Random for mixed strategies, the random module if None
+        :return: 'r' to move all in, 'c' to call, 'f' to fold
+        :rtype: str
+        """
+        chart = self.chart(stack / MINIMUM_WAGER)
+        probability = chart['call' if facingPush else 'push'][classIndex(hole)]
+        if (rng or random).random() < probability:
+            return 'c' if facingPush else 'r'
+        return 'f'
+
+    def close(self):
+        """
+        Unmaps the cached equity matrix
+        """
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Solves the charts for a few stack depths and prints the pushing and calling ranges
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Solve heads up push or fold charts')
+        parser.add_argument('--stacks', type=float, nargs='+', default=[5, 10, 15, 20],
+                            help='stack depths in multiples of the minimum wager')
+        parser.add_argument('--workers', type=int, default=None)
+        args = parser.parse_args()
+        start = time.perf_counter()
+        pushFold = PushFold(workers=args.workers)
+        print('Equity matrix and charts ready in', round(time.perf_counter() - start, 2), 's')
+        for stack in args.stacks:
+            start = time.perf_counter()
+            chart = pushFold.chart(stack)
+            pushes = [name for name, p in zip(CLASS_NAMES, chart['push']) if p >= 0.5]
+            calls = [name for name, p in zip(CLASS_NAMES, chart['call']) if p >= 0.5]
+            print(stack, 'x minimum wager:', len(pushes), 'push,', len(calls), 'call, exploitability',
+                  round(chart['exploitability'], 4), 'in', round(time.perf_counter() - start, 4), 's')
+            print('  push:', ' '.join(pushes))
+            print('  call:', ' '.join(calls))
+        pushFold.close()
+
+
+    main()
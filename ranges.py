@@ -0,0 +1,241 @@
+"""
+Weighted hand ranges in standard notation and range against range equity
+Ranges are parsed into combos of 2 card codes with a 52 bit card mask each, so conflicting combos are found
+with a single AND instead of comparing Card objects
+"""
+import bisect
+import itertools
+import random
+
+from evaluator import BIT, VALUE, evaluate
+from equity import remainingCards
+
+RANK_LETTERS = '23456789TJQKA'
+SUIT_LETTERS = 'cdhs'
+
+
+def _cardsOfValue(value: int) -> list:
+    """
+    :return: the 4 card codes with a value from 0 (deuce) to 12 (ace)
+    """
+    rankIndex = (value + 1) % 13
+    return [rankIndex * 4 + suit for suit in range(4)]
+
+
+def parseCard(text: str) -> int:
+    """
+    :param text: a card such as 'Ah' or 'Td'
+    :type text: str
+    :return: the card code
+    :rtype: int
+    """
+    value = RANK_LETTERS.index(text[0].upper())
+    return _cardsOfValue(value)[SUIT_LETTERS.index(text[1].lower())]
+
+
+def handClassCombos(high: int, low: int, kind: str) -> list:
+    """
+    :param high: value of the higher card from 0 (deuce) to 12 (ace)
+    :type high: int
+    :param low: value of the lower card
+    :type low: int
+    :param kind: 's' for suited, 'o' for offsuit, '' for both (pairs always use '')
+    :type kind: str
+    :return: every combo of the hand class as card code pairs
+    :rtype: list
+    """
+    if high == low:
+        return list(itertools.combinations(_cardsOfValue(high), 2))
+    combos = []
+    for first in _cardsOfValue(high):
+        for second in _cardsOfValue(low):
+            suited = first & 3 == second & 3
+            if kind == '' or (kind == 's') == suited:
+                combos.append((first, second))
+    return combos
+
+
+def _parseClass(text: str) -> list:
+    """
+    :return: [high value, low value, kind] for a hand class such as 'AKs', 'QQ' or 'T9o'
+    """
+    high = RANK_LETTERS.index(text[0].upper())
+    low = RANK_LETTERS.index(text[1].upper())
+    if low > high:
+        high, low = low, high
+    kind = text[2].lower() if len(text) > 2 else ''
+    return [high, low, kind]
+
+
+def _expandToken(token: str) -> list:
+    """
+    Expands one comma separated part of a range
+    Supports QQ, QQ+, 22-99, AKs, ATs+, A2s-A5s, AKo, AK and exact combos such as AhKh
+    :return: list of combos
+    """
+    if len(token) == 4 and token[1].lower() in SUIT_LETTERS:
+        return [(parseCard(token[:2]), parseCard(token[2:]))]
+    if '-' in token:
+        first, last = token.split('-')
+        start = _parseClass(first)
+        end = _parseClass(last)
+        combos = []
+        if start[0] == start[1]:
+            for value in range(min(start[0], end[0]), max(start[0], end[0]) + 1):
+                combos += handClassCombos(value, value, '')
+        else:
+            for value in range(min(start[1], end[1]), max(start[1], end[1]) + 1):
+                combos += handClassCombos(start[0], value, start[2])
+        return combos
+    plus = token.endswith('+')
+    high, low, kind = _parseClass(token.rstrip('+'))
+    if not plus:
+        return handClassCombos(high, low, kind)
+    combos = []
+    if high == low:
+        for value in range(high, 13):
+            combos += handClassCombos(value, value, '')
+    else:
+        for value in range(low, high):
+            combos += handClassCombos(high, value, kind)
+    return combos
+
+
+class HandRange:
+    """
+    A weighted set of 2 card combos
+    """
+
+    def __init__(self, text: str = ''):
+        """
+        Constructor method
+        :param text: range in standard notation such as 'QQ+, AKs, A5s-A2s:0.5', a weight can follow a colon
+        :type text: str
+        """
+        self._weights = {}
+        for token in text.replace(' ', '').split(','):
+            if not token:
+                continue
+            weight = 1.0
+            if ':' in token:
+                token, weight = token.split(':')
+                weight = float(weight)
+            for combo in _expandToken(token):
+                self.add(combo, weight)
+
+    def add(self, combo, weight: float = 1.0):
+        """
+        Adds a combo, replacing its weight if it is already in the range
+        :param combo: 2 card codes
+        :param weight: how likely the combo is relative to the others
+        :type weight: float
+        """
+        self._weights[tuple(sorted(combo))] = weight
+
+    def combos(self, dead: int = 0) -> list:
+        """
+        :param dead: mask of cards that are already out, combos holding any of them are left out
+        :type dead: int
+        :return: [combo, mask, weight] for every combo not blocked by the dead cards
+        :rtype: list
+        """
+        result = []
+        for combo, weight in self._weights.items():
+            mask = BIT[combo[0]] | BIT[combo[1]]
+            if weight > 0 and not mask & dead:
+                result.append([combo, mask, weight])
+        return result
+
+    def __len__(self):
+        return len(self._weights)
+
+
+def rangeEquity(hero: HandRange, villain: HandRange, board=(), boards: int = 500, rng=None) -> float:
+    """
+    Equity of one range against another, weighted by combo weights and card removal
+    Every combo is evaluated once per runout and the combo against combo comparison is done by sorting the
+    villain's hand values and looking up each hero combo with bisect, conflicting combos are taken back out
+    :param hero: the range to find the equity of
+    :type hero: HandRange
+    :param villain: the opposing range
+    :type villain: HandRange
+    :param board: known river cards as card codes
+    :param boards: how many runouts to sample, every runout is used when there are fewer
+    :type boards: int
+    :param rng: random.Random to sample with, the random module by default
+    :return: share of the pot the hero range wins, ties count as half
+    :rtype: float
+    """
+    rng = rng or random
+    board = list(board)
+    boardMask = 0
+    for code in board:
+        boardMask |= BIT[code]
+    heroCombos = hero.combos(boardMask)
+    villainCombos = villain.combos(boardMask)
+    # For each hero combo the villain combos sharing a card with it
+    conflicts = [[j for j in range(len(villainCombos)) if villainCombos[j][1] & heroCombo[1]]
+                 for heroCombo in heroCombos]
+
+    deck = remainingCards(board)
+    missing = 5 - len(board)
+    total = 0.0
+    weightTotal = 0.0
+    for runout in _runouts(deck, missing, boards, rng):
+        runoutMask = boardMask
+        for code in runout:
+            runoutMask |= BIT[code]
+        full = board + list(runout)
+        villainValues = [evaluate(list(combo[0]) + full) if not combo[1] & runoutMask else -1
+                         for combo in villainCombos]
+        order = sorted(range(len(villainCombos)), key=villainValues.__getitem__)
+        sortedValues = [villainValues[j] for j in order]
+        # Running totals of villain weight in value order, so the weight beaten is one bisect away
+        cumulative = [0.0]
+        for j in order:
+            cumulative.append(cumulative[-1] + (villainCombos[j][2] if villainValues[j] >= 0 else 0.0))
+        for i, heroCombo in enumerate(heroCombos):
+            if heroCombo[1] & runoutMask:
+                continue
+            value = evaluate(list(heroCombo[0]) + full)
+            below = bisect.bisect_left(sortedValues, value)
+            upTo = bisect.bisect_right(sortedValues, value)
+            wins = cumulative[below]
+            ties = cumulative[upTo] - cumulative[below]
+            live = cumulative[-1]
+            for j in conflicts[i]:
+                other = villainValues[j]
+                if other < 0:
+                    continue
+                weight = villainCombos[j][2]
+                live -= weight
+                if other < value:
+                    wins -= weight
+                elif other == value:
+                    ties -= weight
+            total += heroCombo[2] * (wins + ties / 2)
+            weightTotal += heroCombo[2] * live
+    return total / weightTotal if weightTotal else 0.0
+
+
+def _runouts(deck, missing: int, boards: int, rng):
+    """
+    Yields every runout when there are at most boards of them, otherwise boards random ones
+    """
+    count = 1
+    for i in range(missing):
+        count = count * (len(deck) - i) // (i + 1)
+    if count <= boards:
+        yield from itertools.combinations(deck, missing)
+    else:
+        for _ in range(boards):
+            yield rng.sample(deck, missing)
+
+
+def comboName(combo) -> str:
+    """
+    :param combo: 2 card codes
+    :return: the combo written like 'AhKh'
+    :rtype: str
+    """
+    return ''.join(RANK_LETTERS[VALUE[code]] + SUIT_LETTERS[code & 3] for code in combo)
@@ -0,0 +1,287 @@
+"""
+Renders recorded or simulated hands to image sequences without a window
+The game draws with the SDL dummy driver onto an offscreen surface, frames go through an encoder thread that
+writes PNG files or one raw RGB file per hand, and hands are spread over worker processes
+A hand script is a JSON line such as {"seed": 7, "actions": ["c", "r 40"]} or
+{"snapshot": "<hex of Game.snapshot()>", "actions": ["f"]}, without actions the player checks to the end
+"""
+import os
+
+# Must be set before pygame starts, main imports and initializes it
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# SDL would turn SIGTERM into a quit event, then Pool.terminate() could never stop a worker
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+import argparse
+import json
+import multiprocessing
+import queue
+import random
+import struct
+import threading
+import time
+import zlib
+
+import pygame
+
+from main import DIMENSIONS, JOB_DONE, LAYOUT, Game
+
+# Frames each picture stays on screen at 60 frames per second
+FRAMES_PER_ACTION = 30
+FORMATS = ['png', 'raw']
+
+
+def encodePng(width: int, height: int, pixels: bytes, level: int = 1) -> bytes:
+    """
+    Encodes 8 bit RGB pixels as a PNG, zlib does the work and lets go of the GIL while it does
+    :param width: width in pixels
+    :type width: int
+    :param height: height in pixels
+    :type height: int
+    :param pixels: rows of RGB bytes from top to bottom
+    :type pixels: bytes
+    :param level: zlib compression level, low levels are much faster and only a little bigger
+    :type level: int
+    :return: the PNG file
+    :rtype: bytes
+    """
+    stride = width * 3
+    # Every row starts with filter type 0, no filtering
+    rows = b''.join(b'\0' + pixels[top:top + stride] for top in range(0, stride * height, stride))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows, level)) +
+            chunk(b'IEND', b''))
+
+
+class Encoder:
+    """
+    Writes frames on a background thread so rendering the next frame overlaps encoding the last one
+    """
+
+    def __init__(self, size, form: str = 'png', depth: int = 8):
+        """
+        Constructor method
+        :param size: width and height of the frames
+        :param form: 'png' for one PNG file per frame, 'raw' for one RGB24 file per hand
+        :type form: str
+        :param depth: frames that can wait to be written before the renderer has to wait
+        :type depth: int
+        """
+        self._size = size
+        self._form = form
+        self._queue = queue.Queue(depth)
+        self._error = None
+        self.frames = 0
+        self.pictures = 0
+        self._thread = threading.Thread(target=self._run, name='encoder', daemon=True)
+        self._thread.start()
+
+    def write(self, path: str, pixels: bytes, repeat: int = 1):
+        """
+        Queues a frame
+        :param path: PNG file name pattern with a {} for the frame number, or the raw file to append to
+        :type path: str
+        :param pixels: RGB bytes of the frame
+        :type pixels: bytes
+        :param repeat: how many frames in a row show this picture, it is only encoded once
+        :type repeat: int
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put([path, pixels, repeat])
+
+    def _run(self):
+        """
+        Encoder thread
+        """
+        numbers = {}
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, pixels, repeat = item
+            try:
+                if self._form == 'png':
+                    data = encodePng(self._size[0], self._size[1], pixels)
+                    for _ in range(repeat):
+                        number = numbers.get(path, 0)
+                        numbers[path] = number + 1
+                        with open(path.format('%05d' % number), 'wb') as file:
+                            file.write(data)
+                else:
+                    with open(path, 'ab') as file:
+                        for _ in range(repeat):
+                            file.write(pixels)
+                self.frames += repeat
+                self.pictures += 1
+            except Exception as error:
+                self._error = error
+
+    def close(self):
+        """
+        Waits for every queued frame to be written
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def _pixels(surface) -> bytes:
+    """
+    :return: the surface as rows of RGB bytes
+    """
+    toBytes = getattr(pygame.image, 'tobytes', None) or pygame.image.tostring
+    return toBytes(surface, 'RGB')
+
+
+def _waitForShowdown(game: Game, timeout: float = 5.0):
+    """
+    Hands the background jobs' results to the game until the showdown is scored
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        for event in pygame.event.get(JOB_DONE):
+            game.jobDone(event.job)
+        if not game.showdownPending():
+            return
+        if time.perf_counter() >= deadline:
+            raise TimeoutError('Showdown was not scored in ' + str(timeout) + ' s')
+        time.sleep(0.001)
+
+
+def renderHand(game: Game, surface, script: dict, encoder: Encoder, path: str, hold: int = FRAMES_PER_ACTION):
+    """
+    Plays one hand script and sends a frame for the start and for every action to the encoder
+    :param game: the game drawing onto surface
+    :type game: Game
+    :param surface: the offscreen surface
+    :param script: {'seed': int, 'snapshot': hex str, 'actions': list}, all optional
+    :type script: dict
+    :param encoder: where frames go
+    :type encoder: Encoder
+    :param path: file name or pattern handed to the encoder
+    :type path: str
+    :param hold: frames each picture is shown for
+    :type hold: int
+    """
+    random.seed(script.get('seed'))
+    game.newGame()
+    if script.get('snapshot'):
+        game.restore(bytes.fromhex(script['snapshot']))
+    actions = script.get('actions')
+    if actions is None:
+        actions = ['c'] * 2
+    game.display()
+    encoder.write(path, _pixels(surface), hold)
+    for action in actions:
+        if game.quit():
+            break
+        parts = str(action).split()
+        game.act(parts[0], int(parts[1]) if len(parts) > 1 else 0)
+        if game.raising():
+            raise ValueError('Raise of ' + str(action) + ' is not allowed here')
+        _waitForShowdown(game)
+        game.display()
+        encoder.write(path, _pixels(surface), hold)
+
+
+def renderScripts(task) -> list:
+    """
+    Worker side of renderAll(), renders a share of the hands with its own pygame and encoder thread
+    :param task: [[hand number, script], ...], output directory, format, frame size, frames per picture
+    :return: [hands, frames, distinct pictures] rendered
+    :rtype: list
+    """
+    scripts, outDir, form, size, hold = task
+    pygame.init()
+    surface = pygame.Surface(size)
+    # Put back afterwards, renderAll() runs a single worker's share in the caller's process
+    previous = LAYOUT.size
+    LAYOUT.resize(size)
+    game = Game(surface, statsPath=None)
+    encoder = Encoder(size, form)
+    try:
+        for number, script in scripts:
+            if form == 'png':
+                handDir = os.path.join(outDir, 'hand_%05d' % number)
+                os.makedirs(handDir, exist_ok=True)
+                path = os.path.join(handDir, 'frame_{}.png')
+            else:
+                path = os.path.join(outDir, 'hand_%05d.rgb' % number)
+                if os.path.exists(path):
+                    os.remove(path)
+            renderHand(game, surface, script, encoder, path, hold)
+    finally:
+        encoder.close()
+        game.close()
+        LAYOUT.resize(previous)
+    return [len(scripts), encoder.frames, encoder.pictures]
+
+
+def renderAll(scripts, outDir: str, form: str = 'png', size=None, workers: int = None,
+              hold: int = FRAMES_PER_ACTION) -> list:
+    """
+    Renders every hand script, hands are dealt out to worker processes round robin
+    :param scripts: hand scripts
+    :param outDir: directory for the frames
+    :type outDir: str
+    :param form: 'png' or 'raw'
+    :type form: str
+    :param size: frame width and height, DIMENSIONS by default
+    :param workers: processes to render with, None for one per CPU, 1 to render in this process
+    :type workers: int
+    :param hold: frames each picture is shown for
+    :type hold: int
+    :return: [hands, frames, distinct pictures] rendered
+    :rtype: list
+    """
+    size = list(size or DIMENSIONS)
+    outDir = os.path.abspath(outDir)
+    os.makedirs(outDir, exist_ok=True)
+    numbered = list(enumerate(scripts))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(numbered)))
+    tasks = [[numbered[i::workers], outDir, form, size, hold] for i in range(workers)]
+    if workers == 1:
+        results = [renderScripts(tasks[0])]
+    else:
+        # Spawned rather than forked, SDL should start fresh in every worker
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            results = pool.map(renderScripts, tasks)
+    return [sum(result[i] for result in results) for i in range(3)]
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Renders hand scripts from a file, or simulated hands, and prints how fast it went
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Render hands to image sequences without a window')
+        parser.add_argument('--scripts', default=None, help='JSON lines file of hand scripts')
+        parser.add_argument('--hands', type=int, default=10, help='simulated hands when no scripts are given')
+        parser.add_argument('--out', default='replays')
+        parser.add_argument('--format', choices=FORMATS, default='png')
+        parser.add_argument('--size', type=int, nargs=2, default=None, help='frame width and height')
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--hold', type=int, default=FRAMES_PER_ACTION, help='frames per picture')
+        args = parser.parse_args()
+        if args.scripts is not None:
+            with open(args.scripts) as file:
+                scripts = [json.loads(line) for line in file if line.strip()]
+        else:
+            scripts = [{'seed': seed} for seed in range(args.hands)]
+        start = time.perf_counter()
+        hands, frames, pictures = renderAll(scripts, args.out, args.format, args.size, args.workers, args.hold)
+        seconds = time.perf_counter() - start
+        # Held frames repeat a picture, so the pictures per second are printed as well
+        print('Rendered', hands, 'hands,', frames, 'frames of', pictures, 'pictures in', round(seconds, 2), 's,',
+              round(frames / seconds / 60, 1), 'x real time,', round(pictures / seconds, 1), 'pictures/s')
+
+
+    main()
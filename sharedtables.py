@@ -0,0 +1,278 @@
+"""
+Publishes the evaluator lookup tables once so every worker process attaches to the same memory
+Tables go into a multiprocessing.shared_memory block or a read only mmap file, workers index them through
+memoryviews without copying anything
+"""
+import argparse
+import contextlib
+import itertools
+import mmap
+import multiprocessing
+import multiprocessing.util
+import os
+import struct
+import time
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+import evaluator
+import variants
+
+MAGIC = b'THTB'
+VERSION = 1
+# magic, version, number of tables
+HEADER = struct.Struct('<4sII')
+# name, typecode, byte offset, number of items
+ENTRY = struct.Struct('<32s1sxxxQQ')
+DEFAULT_NAME = 'texasholdem_tables'
+
+
+def buildTables() -> dict:
+    """
+    Collects every table worth sharing, the evaluator's and those of each variant
+    :return: {table name: array}
+    :rtype: dict
+    """
+    straights, topFive = evaluator.tables()
+    tables = {'evaluator.straights': array('i', straights), 'evaluator.topFive': array('i', topFive)}
+    for name in variants.VARIANT_NAMES:
+        for tableName, table in variants.variant(name).tables().items():
+            tables[name + '.' + tableName] = table
+    return tables
+
+
+def _layout(tables: dict) -> list:
+    """
+    :return: the directory entries and the total size in bytes, every table starts on an 8 byte boundary
+    """
+    offset = HEADER.size + ENTRY.size * len(tables)
+    entries = []
+    for name, table in tables.items():
+        offset = (offset + 7) & ~7
+        entries.append([name, table.typecode, offset, len(table)])
+        offset += table.itemsize * len(table)
+    return [entries, offset]
+
+
+def _write(buffer, tables: dict, entries: list):
+    """
+    Writes the header, the directory and the table contents into a buffer
+    """
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, len(entries))
+    for i, (name, typecode, offset, length) in enumerate(entries):
+        ENTRY.pack_into(buffer, HEADER.size + ENTRY.size * i, name.encode(), typecode.encode(), offset, length)
+        data = tables[name].tobytes()
+        buffer[offset:offset + len(data)] = data
+
+
+def _read(buffer) -> dict:
+    """
+    :return: {table name: memoryview} over a buffer written by _write()
+    """
+    magic, version, count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a table file of version ' + str(VERSION))
+    view = memoryview(buffer)
+    tables = {}
+    for i in range(count):
+        name, typecode, offset, length = ENTRY.unpack_from(buffer, HEADER.size + ENTRY.size * i)
+        size = struct.calcsize(typecode.decode())
+        tables[name.rstrip(b'\0').decode()] = view[offset:offset + size * length].cast(typecode.decode())
+    return tables
+
+
+def _attachBlock(name: str):
+    """
+    Attaches to an existing shared memory block without handing it to this process's resource tracker
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block and the tracker unlinks it once this process exits,
+        # which would pull the tables out from under every other worker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedTables:
+    """
+    A set of named tables living in shared memory or in a memory mapped file
+    """
+
+    def __init__(self, tables: dict, handle, owner: bool):
+        """
+        Constructor method, use publish() or attach() instead
+        :param tables: {table name: memoryview}
+        :type tables: dict
+        :param handle: the SharedMemory or mmap keeping the memory alive
+        :param owner: whether this process created the memory and should free it
+        :type owner: bool
+        """
+        self.tables = tables
+        self._handle = handle
+        self._owner = owner
+
+    @staticmethod
+    def publish(tables: dict, name: str = DEFAULT_NAME, path: str = None):
+        """
+        Copies tables into a new shared memory block, or into a file when a path is given
+        :param tables: {table name: array}
+        :type tables: dict
+        :param name: name of the shared memory block
+        :type name: str
+        :param path: file to write instead of using shared memory
+        :type path: str
+        :return: the published tables
+        :rtype: SharedTables
+        """
+        entries, size = _layout(tables)
+        if path is not None:
+            buffer = bytearray(size)
+            _write(buffer, tables, entries)
+            with open(path + '.tmp', 'wb') as file:
+                file.write(buffer)
+            os.replace(path + '.tmp', path)
+            return SharedTables.attach(path=path)
+        block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _write(block.buf, tables, entries)
+        return SharedTables(_read(block.buf), block, True)
+
+    @staticmethod
+    def attach(name: str = DEFAULT_NAME, path: str = None):
+        """
+        Attaches to tables another process published
+        :param name: name of the shared memory block
+        :type name: str
+        :param path: file written by publish(path=...) to map read only instead
+        :type path: str
+        :return: the tables
+        :rtype: SharedTables
+        """
+        if path is not None:
+            with open(path, 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            return SharedTables(_read(mapped), mapped, False)
+        block = _attachBlock(name)
+        return SharedTables(_read(block.buf), block, False)
+
+    def install(self):
+        """
+        Points the evaluator and every variant at these tables
+        """
+        evaluator.useTables(self.tables['evaluator.straights'], self.tables['evaluator.topFive'])
+        for name in variants.VARIANT_NAMES:
+            prefix = name + '.'
+            own = {key[len(prefix):]: table for key, table in self.tables.items() if key.startswith(prefix)}
+            variants.variant(name, own)
+
+    def close(self):
+        """
+        Detaches from the tables and frees them if this process published them
+        """
+        for table in self.tables.values():
+            table.release()
+        self.tables = {}
+        self._handle.close()
+        if self._owner:
+            self._handle.unlink()
+
+
+def residentMemory() -> int:
+    """
+    :return: resident memory of this process in bytes
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # No /proc on macOS, ru_maxrss is the peak rather than the current size there and already in bytes
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+_attached = None
+_coldStart = 0.0
+_poolNumbers = itertools.count()
+
+
+def attachWorker(name: str = DEFAULT_NAME, path: str = None, started: float = None):
+    """
+    Pool initializer, attaches the tables and installs them for this worker
+    :param name: name of the shared memory block
+    :type name: str
+    :param path: mapped file to use instead of shared memory
+    :type path: str
+    :param started: time.time() when the pool was created, so the cold start counts starting the process and its
+        imports as well, None to only time attaching
+    :type started: float
+    """
+    global _attached, _coldStart
+    start = time.perf_counter()
+    _attached = SharedTables.attach(name, path)
+    _attached.install()
+    # Detach while the worker shuts down, left to the garbage collector the block complains views are still out
+    multiprocessing.util.Finalize(None, _attached.close, exitpriority=0)
+    _coldStart = time.time() - started if started is not None else time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def sharedPool(workers: int):
+    """
+    A multiprocessing.Pool whose workers attach to tables published for it instead of building their own, the
+    tables are freed once the pool is done
+    :param workers: number of worker processes
+    :type workers: int
+    :return: context manager giving the pool
+    """
+    name = DEFAULT_NAME + '_' + str(os.getpid()) + '_' + str(next(_poolNumbers))
+    published = SharedTables.publish(buildTables(), name)
+    pool = multiprocessing.Pool(workers, attachWorker, (name, None, time.time()))
+    try:
+        yield pool
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        published.close()
+
+
+def workerReport(_=None) -> dict:
+    """
+    :return: the worker's pid, how long attaching took and its resident memory
+    :rtype: dict
+    """
+    return {'pid': os.getpid(), 'coldStart': _coldStart, 'rss': residentMemory()}
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Publishes the tables, starts a pool attached to them and prints each worker's cold start and memory
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Share the lookup tables with a pool of workers')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--path', default=None, help='use a read only mmap file instead of shared memory')
+        args = parser.parse_args()
+        start = time.perf_counter()
+        published = SharedTables.publish(buildTables(), path=args.path)
+        print('Published', len(published.tables), 'tables in', round(time.perf_counter() - start, 4), 's')
+        with multiprocessing.Pool(args.workers, attachWorker, (DEFAULT_NAME, args.path, time.time())) as pool:
+            reports = pool.map(workerReport, range(args.workers * 4))
+        seen = {}
+        for report in reports:
+            seen[report['pid']] = report
+        for report in seen.values():
+            print('worker', report['pid'], 'cold start', round(report['coldStart'] * 1000, 3), 'ms',
+                  'rss', report['rss'] // 1024, 'KiB')
+        published.close()
+
+
+    main()
@@ -0,0 +1,203 @@
+"""
+Per player statistics kept as running counters
+Every action and showdown adds to a few counters in one flat array, so updates cost the same however many hands
+a player has, and shards from parallel simulations are merged by adding their arrays
+"""
+import json
+import operator
+import os
+import struct
+from array import array
+
+# Counters kept for every player, in the order they sit in the array
+FIELDS = ['hands', 'vpipHands', 'actions', 'raises', 'facedRaise', 'foldedToRaise', 'showdowns', 'showdownWins',
+          'handsWon', 'potTotal']
+_FIELD = {name: index for index, name in enumerate(FIELDS)}
+HANDS, VPIP_HANDS, ACTIONS, RAISES, FACED_RAISE, FOLDED_TO_RAISE, SHOWDOWNS, SHOWDOWN_WINS, HANDS_WON, POT_TOTAL = \
+    range(len(FIELDS))
+MAGIC = b'THST'
+VERSION = 1
+# magic, version, number of fields, bytes of the JSON list of names
+HEADER = struct.Struct('<4sIII')
+
+
+class PlayerStats:
+    """
+    Counters for any number of players, stored player by player in an array of 64 bit ints
+    """
+
+    def __init__(self, path: str = None, saveEvery: int = 100):
+        """
+        Constructor method
+        :param path: file the counters are loaded from and saved to, None to only keep them in memory
+        :type path: str
+        :param saveEvery: save after this many finished hands, 0 to only save when asked
+        :type saveEvery: int
+        """
+        self._names = []
+        self._slots = {}
+        self._counters = array('q')
+        self._path = path
+        self._saveEvery = saveEvery
+        self._unsaved = 0
+        # Players who already voluntarily put chips in this hand, VPIP counts a hand once
+        self._inPot = set()
+        self._players = []
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def _slot(self, player: str) -> int:
+        """
+        :return: index of the player's first counter, adding the player on first sight
+        """
+        slot = self._slots.get(player)
+        if slot is None:
+            slot = self._slots[player] = len(self._counters)
+            self._names.append(player)
+            self._counters.extend([0] * len(FIELDS))
+        return slot
+
+    def startHand(self, players):
+        """
+        Call when a new hand is dealt
+        :param players: names of everyone dealt in
+        """
+        self._inPot = set()
+        self._players = list(players)
+        for player in self._players:
+            self._counters[self._slot(player) + HANDS] += 1
+
+    def recordAction(self, player: str, action: str, facingRaise: bool = False):
+        """
+        Call for every betting action
+        :param player: who acted
+        :type player: str
+        :param action: 'c' to check or call, 'r' to raise, 'f' to fold
+        :type action: str
+        :param facingRaise: whether the player was facing a raise, a 'c' is then a call
+        :type facingRaise: bool
+        """
+        slot = self._slot(player)
+        counters = self._counters
+        counters[slot + ACTIONS] += 1
+        if action == 'r':
+            counters[slot + RAISES] += 1
+        if facingRaise:
+            counters[slot + FACED_RAISE] += 1
+            if action == 'f':
+                counters[slot + FOLDED_TO_RAISE] += 1
+        if (action == 'r' or (action == 'c' and facingRaise)) and player not in self._inPot:
+            self._inPot.add(player)
+            counters[slot + VPIP_HANDS] += 1
+
+    def endHand(self, pot: int, winners, showdown: bool):
+        """
+        Call when a hand is over
+        :param pot: the final pot
+        :type pot: int
+        :param winners: names of whoever won or split the pot
+        :param showdown: whether the hand went to showdown
+        :type showdown: bool
+        """
+        counters = self._counters
+        for player in self._players:
+            slot = self._slot(player)
+            counters[slot + POT_TOTAL] += pot
+            if showdown:
+                counters[slot + SHOWDOWNS] += 1
+                if player in winners:
+                    counters[slot + SHOWDOWN_WINS] += 1
+            if player in winners:
+                counters[slot + HANDS_WON] += 1
+        self._unsaved += 1
+        if self._path is not None and self._saveEvery and self._unsaved >= self._saveEvery:
+            self.save(self._path)
+
+    def counter(self, player: str, field: str) -> int:
+        """
+        :param player: name of the player
+        :type player: str
+        :param field: one of FIELDS
+        :type field: str
+        :return: the raw counter, 0 for a player never seen
+        :rtype: int
+        """
+        slot = self._slots.get(player)
+        return 0 if slot is None else self._counters[slot + _FIELD[field]]
+
+    def _ratio(self, player, numerator, denominator) -> float:
+        bottom = self.counter(player, denominator)
+        return self.counter(player, numerator) / bottom if bottom else 0.0
+
+    def summary(self, player: str) -> dict:
+        """
+        :param player: name of the player
+        :type player: str
+        :return: VPIP, raise frequency, fold to raise, showdown win rate and average pot
+        :rtype: dict
+        """
+        return {'hands': self.counter(player, 'hands'),
+                'vpip': self._ratio(player, 'vpipHands', 'hands'),
+                'raiseFrequency': self._ratio(player, 'raises', 'actions'),
+                'foldToRaise': self._ratio(player, 'foldedToRaise', 'facedRaise'),
+                'showdownWinRate': self._ratio(player, 'showdownWins', 'showdowns'),
+                'averagePot': self._ratio(player, 'potTotal', 'hands')}
+
+    def players(self) -> list:
+        """
+        :return: every player with counters
+        :rtype: list[str]
+        """
+        return list(self._names)
+
+    def merge(self, other):
+        """
+        Adds another shard's counters into this one
+        :param other: counters from another simulation
+        :type other: PlayerStats
+        """
+        if other._names == self._names:
+            # Same players in the same order, add the arrays in one pass
+            self._counters = array('q', map(operator.add, self._counters, other._counters))
+            return
+        counters = self._counters
+        for player, otherSlot in other._slots.items():
+            slot = self._slot(player)
+            for i in range(len(FIELDS)):
+                counters[slot + i] += other._counters[otherSlot + i]
+
+    def save(self, path: str):
+        """
+        Writes the counters, through a temporary file so a crash never leaves a torn file
+        :param path: where to write
+        :type path: str
+        """
+        names = json.dumps(self._names).encode()
+        with open(path + '.tmp', 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(FIELDS), len(names)))
+            file.write(names)
+            self._counters.tofile(file)
+        os.replace(path + '.tmp', path)
+        self._unsaved = 0
+
+    def flush(self):
+        """
+        Saves the hands finished since the last save, call before the program exits
+        """
+        if self._path is not None and self._unsaved:
+            self.save(self._path)
+
+    def load(self, path: str):
+        """
+        Replaces the counters with ones written by save()
+        :param path: file to read
+        :type path: str
+        """
+        with open(path, 'rb') as file:
+            magic, version, fields, size = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or fields != len(FIELDS):
+                raise ValueError(path + ' is not a stats file of version ' + str(VERSION))
+            self._names = json.loads(file.read(size).decode())
+            self._counters = array('q')
+            self._counters.frombytes(file.read())
+        self._slots = {name: i * len(FIELDS) for i, name in enumerate(self._names)}
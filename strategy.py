@@ -0,0 +1,266 @@
+"""
+Decision making for the Bot
+Spots are looked up in a policy table indexed by street, hand bucket and what the bot is facing,
+spots missing from the table fall back to a Monte Carlo equity estimate that is cut off by a time budget
+"""
+import json
+import random
+import time
+from collections import OrderedDict
+
+from cache import canonicalKey
+from equity import timedEquity
+from evaluator import FLUSH, ONE_PAIR, STRAIGHT, THREE_OF_A_KIND, TWO_PAIR, VALUE, category, evaluate
+
+# Number of hand buckets per street, 0 is the weakest
+BUCKETS = 8
+# Street index by number of river cards
+STREETS = {0: 0, 3: 1, 4: 2, 5: 3}
+# What the bot can be facing, the player checked or the player raised
+FACING = ['c', 'r']
+# Actions for each facing, index 0 is the passive one and index 1 the aggressive one
+# Facing a check the bot checks back or raises the minimum wager, facing a raise it folds or matches
+ACTIONS = {'c': ['c', 'r'], 'r': ['f', 'c']}
+
+# How often each bucket takes the aggressive action, used for any spot no policy file covers
+DEFAULT_BET = [0.1, 0.3, 0.5, 0.4, 0.7, 0.9, 0.95, 1.0]
+DEFAULT_CALL = [0.05, 0.2, 0.6, 0.55, 0.85, 0.97, 1.0, 1.0]
+# Runouts a fallback equity has to be pooled from before it is cached, about ±0.01
+CACHE_SAMPLES = 2500
+# Spots whose runouts are still being pooled, the oldest are dropped past this
+POOLED_SPOTS = 4096
+
+
+def street(board) -> int:
+    """
+    :param board: the river cards
+    :return: 0 before the flop, 1 on the flop, 2 on the turn and 3 on the river
+    :rtype: int
+    """
+    return STREETS[len(board)]
+
+
+def spotKey(streetIndex: int, bucket: int, facing: str) -> str:
+    """
+    :param streetIndex: result of street()
+    :type streetIndex: int
+    :param bucket: result of handBucket()
+    :type bucket: int
+    :param facing: 'c' if the player checked, 'r' if the player raised
+    :type facing: str
+    :return: the key of the spot in a policy table
+    :rtype: str
+    """
+    return str(streetIndex) + ':' + str(bucket) + ':' + facing
+
+
+def preflopBucket(hole) -> int:
+    """
+    Buckets 2 hole cards with the Chen formula
+    :param hole: the 2 hole cards as card codes
+    :return: bucket from 0 to BUCKETS - 1
+    :rtype: int
+    """
+    high = max(VALUE[hole[0]], VALUE[hole[1]])
+    low = min(VALUE[hole[0]], VALUE[hole[1]])
+    points = [1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5, 6, 7, 8, 10][high]
+    if high == low:
+        points = max(points * 2, 5)
+    else:
+        gap = high - low - 1
+        points -= [0, 1, 2, 4][gap] if gap < 4 else 5
+        if gap <= 1 and high < 10:
+            points += 1
+    if hole[0] & 3 == hole[1] & 3:
+        points += 2
+    return min(BUCKETS - 1, max(0, int(points) - 3))
+
+
+def drawBucket(hole, board) -> int:
+    """
+    Buckets a hand by its draws, only meaningful before the river
+    :param hole: the 2 hole cards as card codes
+    :param board: 3 or 4 river cards as card codes
+    :return: 2 for a flush draw or open ended straight draw, 1 for a gutshot, 0 for nothing
+    :rtype: int
+    """
+    cards = list(hole) + list(board)
+    suitCounts = [0, 0, 0, 0]
+    for code in cards:
+        suitCounts[code & 3] += 1
+    for code in hole:
+        if suitCounts[code & 3] == 4:
+            return 2
+    rankBits = 0
+    for code in cards:
+        rankBits |= 1 << VALUE[code]
+    # Aces also play low
+    rankBits = rankBits << 1 | rankBits >> 12 & 1
+    gutshot = False
+    for low in range(10):
+        window = rankBits >> low & 0x1F
+        if bin(window).count('1') == 4:
+            if window == 0x0F or window == 0x1E:
+                return 2
+            gutshot = True
+    return 1 if gutshot else 0
+
+
+def handBucket(hole, board) -> int:
+    """
+    Sorts a hand into one of BUCKETS strength buckets without any sampling
+    :param hole: the 2 hole cards as card codes
+    :param board: 0, 3, 4 or 5 river cards as card codes
+    :return: bucket from 0 to BUCKETS - 1
+    :rtype: int
+    """
+    if not board:
+        return preflopBucket(hole)
+    value = evaluate(list(hole) + list(board))
+    made = category(value)
+    boardMade = category(evaluate(board))
+    if made == boardMade:
+        # Playing the board
+        bucket = 1 if made > ONE_PAIR else 0
+    elif made >= FLUSH:
+        bucket = 7
+    elif made == STRAIGHT or made == THREE_OF_A_KIND:
+        bucket = 6
+    elif made == TWO_PAIR and boardMade != ONE_PAIR:
+        bucket = 5
+    else:
+        # One pair, or two pair where one of them is on the board
+        pairValue = value >> 16 & 0xF
+        if made == TWO_PAIR:
+            pairValue = max(VALUE[hole[0]], VALUE[hole[1]])
+        bucket = 4 if pairValue >= max(VALUE[code] for code in board) else 3
+    if len(board) < 5 and bucket < 3:
+        bucket = max(bucket, drawBucket(hole, board))
+    return bucket
+
+
+def defaultPolicy() -> dict:
+    """
+    Builds the policy table used when no solved table is loaded
+    :return: {spotKey: [passive probability, aggressive probability]}
+    :rtype: dict
+    """
+    table = {}
+    for streetIndex in range(4):
+        for bucket in range(BUCKETS):
+            table[spotKey(streetIndex, bucket, 'c')] = [1 - DEFAULT_BET[bucket], DEFAULT_BET[bucket]]
+            table[spotKey(streetIndex, bucket, 'r')] = [1 - DEFAULT_CALL[bucket], DEFAULT_CALL[bucket]]
+    return table
+
+
+class Strategy:
+    """
+    Picks the Bot's action for a spot
+    Table lookups take microseconds, the Monte Carlo fallback never runs longer than the time budget
+    """
+
+    def __init__(self, path: str = None, budget: float = 0.001, cache=None, rng=None):
+        """
+        Constructor method
+        :param path: JSON policy file such as the one the CFR solver writes, None for the default policy
+        :type path: str
+        :param budget: seconds a decision may take when the spot is not in the table
+        :type budget: float
+        :param cache: EquityCache used to remember fallback equities once enough runouts are pooled, None to always
+            sample
+        :param rng: random.Random used to pick actions, the random module by default
+        """
+        self._table = defaultPolicy() if path is None else self.load(path)
+        self._budget = budget
+        self._cache = cache
+        # {cache key: [summed equity, runouts]} of spots seen before but not sampled enough to cache yet
+        self._pooled = OrderedDict()
+        self._rng = rng or random
+        self.lastLatency = 0.0
+        self.fallbacks = 0
+
+    @staticmethod
+    def load(path: str) -> dict:
+        """
+        Reads a policy table from a JSON file
+        :param path: the file written by save() or the CFR solver
+        :type path: str
+        :return: {spotKey: [passive probability, aggressive probability]}
+        :rtype: dict
+        """
+        with open(path) as file:
+            return json.load(file)
+
+    def save(self, path: str):
+        """
+        Writes the policy table to a JSON file
+        :param path: where to write the table
+        :type path: str
+        """
+        with open(path, 'w') as file:
+            json.dump(self._table, file)
+
+    def probabilities(self, hole, board, facing: str) -> list:
+        """
+        :param hole: the bot's 2 hole cards as card codes
+        :param board: the river cards as card codes
+        :param facing: 'c' if the player checked, 'r' if the player raised
+        :type facing: str
+        :return: the policy entry for the spot or None if the table does not have it
+        :rtype: list
+        """
+        return self._table.get(spotKey(street(board), handBucket(hole, board), facing))
+
+    def decide(self, hole, board, facing: str, pot: int, amount: int = 0) -> str:
+        """
+        Chooses the bot's action
+        :param hole: the bot's 2 hole cards as card codes
+        :param board: the river cards as card codes
+        :param facing: 'c' if the player checked, 'r' if the player raised
+        :type facing: str
+        :param pot: the pot including the player's raise
+        :type pot: int
+        :param amount: how much the player raised
+        :type amount: int
+        :return: 'c' to check or match, 'r' to raise the minimum wager, 'f' to fold
+        :rtype: str
+        """
+        start = time.perf_counter()
+        probabilities = self.probabilities(hole, board, facing)
+        if probabilities is not None:
+            aggressive = self._rng.random() < probabilities[1]
+        else:
+            self.fallbacks += 1
+            share = self._equity(hole, board, start + self._budget)
+            if facing == 'r':
+                # Match when the equity beats the price of calling
+                aggressive = share >= amount / (pot + amount)
+            else:
+                aggressive = share >= 0.6
+        self.lastLatency = time.perf_counter() - start
+        return ACTIONS[facing][1 if aggressive else 0]
+
+    def _equity(self, hole, board, deadline: float) -> float:
+        """
+        Equity against a random hand, from the cache when possible and otherwise sampled until the deadline
+        One budget only buys a few dozen runouts, so the runouts of every visit to a spot are pooled and the spot is
+        only cached once the pool is big enough to be worth keeping
+        """
+        if self._cache is None:
+            return timedEquity(hole, board, budget=deadline - time.perf_counter())[0]
+        key = canonicalKey(hole, board, None, 'pooled')
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+        # Working out the key and looking it up came out of the same budget
+        estimate, samples = timedEquity(hole, board, budget=deadline - time.perf_counter())
+        pooled = self._pooled.pop(key, [0.0, 0])
+        pooled[0] += estimate * samples
+        pooled[1] += samples
+        if pooled[1] >= CACHE_SAMPLES:
+            self._cache.put(key, pooled[0] / pooled[1])
+        else:
+            self._pooled[key] = pooled
+            if len(self._pooled) > POOLED_SPOTS:
+                self._pooled.popitem(last=False)
+        return pooled[0] / pooled[1]
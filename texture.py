@@ -0,0 +1,297 @@
+"""
+Precomputed board texture for every flop, turn and river
+Each board is one 32 bit entry in a flat array per street, found by the colex index of its sorted card codes,
+so a query is a few additions and one array read instead of rebuilding rank and suit histograms
+"""
+import argparse
+import time
+from array import array
+
+from evaluator import FLUSH, FOUR_OF_A_KIND, STRAIGHT, STRAIGHT_FLUSH, THREE_OF_A_KIND, VALUE
+from sharedtables import SharedTables
+
+# How the board pairs
+UNPAIRED = 0
+PAIRED = 1
+TWO_PAIRED = 2
+TRIPS = 3
+FULL_BOARD = 4
+QUADS = 5
+
+# Layout of an entry, [shift, width] of each field
+FIELDS = {'pairing': [0, 3], 'maxSuit': [3, 3], 'suits': [6, 3], 'connected': [9, 3], 'straightDraws': [12, 7],
+          'flushDraws': [19, 9], 'nut': [28, 4]}
+STREET_NAMES = {3: 'flop', 4: 'turn', 5: 'river'}
+
+# BINOMIAL[n][k] is n choose k, for the colex index
+BINOMIAL = [[0] * 6 for _ in range(53)]
+for _n in range(53):
+    BINOMIAL[_n][0] = 1
+    for _k in range(1, 6):
+        BINOMIAL[_n][_k] = BINOMIAL[_n - 1][_k - 1] + BINOMIAL[_n - 1][_k] if _n else 0
+
+
+def _windows() -> list:
+    """
+    :return: rank bitmask of every 5 card straight, the wheel first
+    """
+    return [0x100F] + [0x1F << low for low in range(9)]
+
+
+WINDOWS = _windows()
+
+
+def _connected(ranks: int) -> int:
+    """
+    :return: the most ranks of a rank bitmask that fit in one straight
+    """
+    return max(bin(ranks & window).count('1') for window in WINDOWS)
+
+
+def _straightDraws(ranks: int) -> int:
+    """
+    :return: how many of the 91 hole rank pairs, pocket pairs included, hold 4 cards of a straight with the
+        board without making one
+    """
+    draws = 0
+    for high in range(13):
+        for low in range(high + 1):
+            both = ranks | 1 << high | 1 << low
+            best = _connected(both)
+            if best == 4:
+                draws += 1
+    return draws
+
+
+def _rankTables() -> list:
+    """
+    :return: connectedness of every rank bitmask a board can show and the straight draw count of those
+        before the river
+    """
+    connected = [0] * 8192
+    draws = [0] * 8192
+    for ranks in range(8192):
+        size = bin(ranks).count('1')
+        if 1 <= size <= 5:
+            connected[ranks] = _connected(ranks)
+        if 1 <= size <= 4:
+            draws[ranks] = _straightDraws(ranks)
+    return [connected, draws]
+
+
+def colexIndex(codes) -> int:
+    """
+    :param codes: 3 to 5 distinct card codes in any order
+    :return: position of the board in its street's table, from 0 to 52 choose len(codes) - 1
+    :rtype: int
+    """
+    index = 0
+    for i, code in enumerate(sorted(codes)):
+        index += BINOMIAL[code][i + 1]
+    return index
+
+
+def _colex(size: int, limit: int = 52):
+    """
+    :return: generator of every sorted size card board below limit, in colex index order
+    """
+    if size == 0:
+        yield ()
+        return
+    for top in range(size - 1, limit):
+        for rest in _colex(size - 1, top):
+            yield rest + (top,)
+
+
+def describe(codes, connectedTable=None, drawTable=None) -> int:
+    """
+    Works out the texture of one board the slow way, the index is filled in with this
+    :param codes: 3 to 5 card codes
+    :return: the packed entry
+    :rtype: int
+    """
+    counts = [0] * 13
+    suitCounts = [0, 0, 0, 0]
+    suitRanks = [0, 0, 0, 0]
+    ranks = 0
+    for code in codes:
+        value = VALUE[code]
+        counts[value] += 1
+        suitCounts[code & 3] += 1
+        suitRanks[code & 3] |= 1 << value
+        ranks |= 1 << value
+    shape = sorted([count for count in counts if count], reverse=True)
+    if shape[0] == 4:
+        pairing = QUADS
+    elif shape[0] == 3:
+        pairing = FULL_BOARD if len(shape) > 1 and shape[1] >= 2 else TRIPS
+    elif shape[0] == 2:
+        pairing = TWO_PAIRED if shape[1] == 2 else PAIRED
+    else:
+        pairing = UNPAIRED
+    connected = connectedTable[ranks] if connectedTable else _connected(ranks)
+    maxSuit = max(suitCounts)
+    # Two hole cards reach a straight flush when 3 suited board cards share a straight
+    suitedStraight = any(count >= 3 and (connectedTable[suitRanks[suit]] if connectedTable
+                                         else _connected(suitRanks[suit])) >= 3
+                         for suit, count in enumerate(suitCounts))
+    if suitedStraight:
+        nut = STRAIGHT_FLUSH
+    elif pairing != UNPAIRED:
+        nut = FOUR_OF_A_KIND
+    elif maxSuit >= 3:
+        nut = FLUSH
+    elif connected >= 3:
+        nut = STRAIGHT
+    else:
+        nut = THREE_OF_A_KIND
+    straightDraws = 0
+    flushDraws = 0
+    if len(codes) < 5:
+        straightDraws = drawTable[ranks] if drawTable else _straightDraws(ranks)
+        unseen = 52 - len(codes)
+        for count in suitCounts:
+            if count == 2:
+                flushDraws += (13 - count) * (12 - count) // 2
+            elif count == 3:
+                flushDraws += (13 - count) * (unseen - (13 - count))
+    return (pairing | maxSuit << 3 | sum(1 for count in suitCounts if count) << 6 | connected << 9 |
+            straightDraws << 12 | flushDraws << 19 | nut << 28)
+
+
+def field(entry: int, name: str) -> int:
+    """
+    :param entry: an entry from TextureIndex.lookup()
+    :type entry: int
+    :param name: one of FIELDS
+    :type name: str
+    :return: the field's value
+    :rtype: int
+    """
+    shift, width = FIELDS[name]
+    return entry >> shift & (1 << width) - 1
+
+
+def isMonotone(entry: int) -> bool:
+    """
+    :return: whether every card on the board has the same suit
+    :rtype: bool
+    """
+    return field(entry, 'suits') == 1
+
+
+def isTwoTone(entry: int) -> bool:
+    """
+    :return: whether the board shows exactly two suits
+    :rtype: bool
+    """
+    return field(entry, 'suits') == 2
+
+
+def isPaired(entry: int) -> bool:
+    """
+    :return: whether any rank shows up on the board more than once
+    :rtype: bool
+    """
+    return field(entry, 'pairing') != UNPAIRED
+
+
+class TextureIndex:
+    """
+    The texture of every board of 3, 4 or 5 cards
+    """
+
+    def __init__(self, tables: dict = None, streets=(3, 4, 5)):
+        """
+        Constructor method
+        :param tables: {street name: array} from tables() or load(), the missing streets are built
+        :type tables: dict
+        :param streets: board sizes to build when they are not in tables, building the river takes a while
+        """
+        self._tables = {}
+        self._shared = None
+        tables = tables or {}
+        connected = drawTable = None
+        for size in streets:
+            name = STREET_NAMES[size]
+            if name in tables:
+                self._tables[size] = tables[name]
+                continue
+            if connected is None:
+                connected, drawTable = _rankTables()
+            self._tables[size] = array('I', [describe(board, connected, drawTable) for board in _colex(size)])
+
+    def lookup(self, codes) -> int:
+        """
+        :param codes: the 3 to 5 river cards as card codes, such as River.codes()
+        :return: the packed texture of the board, read the fields with field()
+        :rtype: int
+        """
+        return self._tables[len(codes)][colexIndex(codes)]
+
+    def describe(self, codes) -> dict:
+        """
+        :param codes: the 3 to 5 river cards as card codes
+        :return: every field of the board's texture by name
+        :rtype: dict
+        """
+        entry = self.lookup(codes)
+        return {name: field(entry, name) for name in FIELDS}
+
+    def tables(self) -> dict:
+        """
+        :return: {street name: array} of every street built
+        :rtype: dict
+        """
+        return {STREET_NAMES[size]: table for size, table in self._tables.items()}
+
+    def save(self, path: str):
+        """
+        Writes the index to a file load() can map
+        :param path: where to write
+        :type path: str
+        """
+        SharedTables.publish({name: array('I', table) for name, table in self.tables().items()}, path=path).close()
+
+    @staticmethod
+    def load(path: str):
+        """
+        Maps an index written by save() read only, the tables are never copied
+        :param path: file written by save()
+        :type path: str
+        :return: the index
+        :rtype: TextureIndex
+        """
+        shared = SharedTables.attach(path=path)
+        index = TextureIndex(shared.tables, [size for size, name in STREET_NAMES.items() if name in shared.tables])
+        index._shared = shared
+        return index
+
+    def close(self):
+        """
+        Unmaps an index opened with load()
+        """
+        self._tables = {}
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+
+if __name__ == "__main__":
+    def main():
+        """
+        Builds the index and writes it to a file
+        :return:
+        """
+        parser = argparse.ArgumentParser(description='Build the board texture index')
+        parser.add_argument('--out', default='texture.bin')
+        parser.add_argument('--streets', type=int, nargs='+', default=[3, 4, 5], help='board sizes to include')
+        args = parser.parse_args()
+        start = time.perf_counter()
+        index = TextureIndex(streets=args.streets)
+        index.save(args.out)
+        sizes = {name: len(table) for name, table in index.tables().items()}
+        print('Built', sizes, 'in', round(time.perf_counter() - start, 2), 's')
+
+
+    main()
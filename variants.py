@@ -0,0 +1,266 @@
+"""
+Generic best 5 out of N evaluation for Hold'em, Omaha and 6+ short deck
+Each variant generates its own 5 card lookup tables: a rank bitmask table for flushes and an open addressed
+prime product table for every other hand, all flat int lists so they can also live in shared memory
+"""
+import itertools
+from array import array
+
+from evaluator import (FLUSH, FOUR_OF_A_KIND, FULL_HOUSE, HIGH_CARD, ONE_PAIR, STRAIGHT, STRAIGHT_FLUSH,
+                       THREE_OF_A_KIND, TWO_PAIR, VALUE)
+
+# One prime per card value, the product of 5 of them identifies the ranks of a hand whatever their order
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+PRIME = [PRIMES[VALUE[code]] for code in range(52)]
+RANK_BIT = [1 << VALUE[code] for code in range(52)]
+# Slots in the prime product table, a prime a bit over 5 times the 6175 distinct rank combinations
+PRODUCT_SLOTS = 32749
+
+# Category order from weakest to strongest
+STANDARD_ORDER = [HIGH_CARD, ONE_PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FLUSH, FULL_HOUSE, FOUR_OF_A_KIND,
+                  STRAIGHT_FLUSH]
+# With fewer cards in the deck flushes are rarer than full houses
+SHORT_DECK_ORDER = [HIGH_CARD, ONE_PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FULL_HOUSE, FLUSH, FOUR_OF_A_KIND,
+                    STRAIGHT_FLUSH]
+
+
+class Variant:
+    """
+    Rules and lookup tables of one game
+    """
+
+    def __init__(self, name: str, values, holeCards: int, order, useHole: int = 0, tables: dict = None):
+        """
+        Constructor method
+        :param name: name of the game
+        :type name: str
+        :param values: card values in the deck from 0 (deuce) to 12 (ace), lowest first
+        :param holeCards: how many hole cards each player gets
+        :type holeCards: int
+        :param order: hand categories from weakest to strongest
+        :param useHole: exactly how many hole cards a hand must use, 0 for any number
+        :type useHole: int
+        :param tables: tables from tables() to use instead of generating them, such as ones in shared memory
+        :type tables: dict
+        """
+        self.name = name
+        self.values = list(values)
+        self.holeCards = holeCards
+        self.useHole = useHole
+        self._strength = [0] * len(order)
+        for index, categoryIndex in enumerate(order):
+            self._strength[categoryIndex] = index
+        self._straights = self._findStraights()
+        self._flushes = [0] * 8192
+        self._productKeys = [0] * PRODUCT_SLOTS
+        self._productValues = [0] * PRODUCT_SLOTS
+        if tables is None:
+            self._buildTables()
+        else:
+            self.useTables(tables)
+
+    def _findStraights(self) -> dict:
+        """
+        :return: {rank bitmask of 5 values: high card value} for every straight, including the wheel
+        """
+        straights = {}
+        for i in range(len(self.values) - 4):
+            window = self.values[i:i + 5]
+            straights[sum(1 << value for value in window)] = window[-1]
+        # The ace plays low below the lowest 4 values in the deck
+        wheel = self.values[:4] + [12]
+        straights[sum(1 << value for value in wheel)] = self.values[3]
+        return straights
+
+    def _score(self, values, suited: bool) -> int:
+        """
+        Scores 5 card values the same way evaluator.evaluate() packs tie breakers, with the category
+        replaced by its strength in this variant
+        """
+        bits = 0
+        for value in values:
+            bits |= 1 << value
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        groups = sorted(counts.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        shape = [count for value, count in groups]
+        if bits in self._straights:
+            categoryIndex = STRAIGHT_FLUSH if suited else STRAIGHT
+            kickers = [self._straights[bits]]
+        else:
+            kickers = [value for value, count in groups]
+            if suited:
+                categoryIndex = FLUSH
+            elif shape[0] == 4:
+                categoryIndex = FOUR_OF_A_KIND
+            elif shape[0] == 3:
+                categoryIndex = FULL_HOUSE if shape[1] == 2 else THREE_OF_A_KIND
+            elif shape[0] == 2:
+                categoryIndex = TWO_PAIR if shape[1] == 2 else ONE_PAIR
+            else:
+                categoryIndex = HIGH_CARD
+        packed = 0
+        for value in kickers:
+            packed = packed << 4 | value
+        packed <<= 4 * (5 - len(kickers))
+        return self._strength[categoryIndex] << 20 | packed
+
+    def _buildTables(self):
+        """
+        Scores every 5 card rank combination the deck allows
+        """
+        for values in itertools.combinations_with_replacement(self.values, 5):
+            if any(values.count(value) > 4 for value in values):
+                continue
+            product = 1
+            for value in values:
+                product *= PRIMES[value]
+            slot = product % PRODUCT_SLOTS
+            while self._productKeys[slot]:
+                slot = (slot + 1) % PRODUCT_SLOTS
+            self._productKeys[slot] = product
+            self._productValues[slot] = self._score(values, False)
+            if len(set(values)) == 5:
+                self._flushes[sum(1 << value for value in values)] = self._score(values, True)
+
+    def tables(self) -> dict:
+        """
+        :return: the lookup tables as flat int arrays that can be published to other processes
+        :rtype: dict
+        """
+        return {'flush': array('i', self._flushes), 'productKeys': array('i', self._productKeys),
+                'productValues': array('i', self._productValues)}
+
+    def useTables(self, tables: dict):
+        """
+        Switches to tables built elsewhere, they are indexed in place and never copied
+        :param tables: 'flush', 'productKeys' and 'productValues' arrays or memoryviews as tables() returns them
+        :type tables: dict
+        """
+        self._flushes = tables['flush']
+        self._productKeys = tables['productKeys']
+        self._productValues = tables['productValues']
+
+    def _product(self, product: int) -> int:
+        """
+        :return: the strength of the non flush hand with this prime product
+        """
+        keys = self._productKeys
+        slot = product % PRODUCT_SLOTS
+        while keys[slot] != product:
+            if not keys[slot]:
+                raise KeyError(product)
+            slot = (slot + 1) % PRODUCT_SLOTS
+        return self._productValues[slot]
+
+    def deck(self) -> list:
+        """
+        :return: the card codes in this variant's deck
+        :rtype: list[int]
+        """
+        return [code for code in range(52) if VALUE[code] in self.values]
+
+    def evaluate5(self, codes) -> int:
+        """
+        :param codes: exactly 5 card codes
+        :return: the hand's strength, higher is better
+        :rtype: int
+        """
+        a, b, c, d, e = codes
+        if a & 3 == b & 3 == c & 3 == d & 3 == e & 3:
+            return self._flushes[RANK_BIT[a] | RANK_BIT[b] | RANK_BIT[c] | RANK_BIT[d] | RANK_BIT[e]]
+        return self._product(PRIME[a] * PRIME[b] * PRIME[c] * PRIME[d] * PRIME[e])
+
+    def evaluate(self, hole, board) -> int:
+        """
+        Best 5 card hand following this variant's rules on hole card use
+        :param hole: the player's hole cards
+        :param board: the river cards
+        :return: the hand's strength, higher is better
+        :rtype: int
+        """
+        if self.useHole:
+            return self.evaluateMany([hole], board)[0]
+        return max(self.evaluate5(combo) for combo in itertools.combinations(list(hole) + list(board), 5))
+
+    def evaluateMany(self, holes, board) -> list:
+        """
+        Scores several players on the same board at once
+        For games that use an exact number of hole cards the board subsets are combined once and reused by every
+        player, and each combination is scored from precombined prime products, rank bits and suits
+        :param holes: list of hole cards, one per player
+        :param board: the river cards
+        :return: the strength of each player's hand
+        :rtype: list[int]
+        """
+        if not self.useHole:
+            return [self.evaluate(hole, board) for hole in holes]
+        boardParts = self._parts(board, 5 - self.useHole)
+        flushes = self._flushes
+        keys = self._productKeys
+        values = self._productValues
+        results = []
+        for hole in holes:
+            best = 0
+            for holeProduct, holeBits, holeSuit in self._parts(hole, self.useHole):
+                for boardProduct, boardBits, boardSuit in boardParts:
+                    if holeSuit >= 0 and holeSuit == boardSuit:
+                        value = flushes[holeBits | boardBits]
+                    else:
+                        # Same probe as _product(), inlined since this loop runs 60 times per Omaha hand
+                        product = holeProduct * boardProduct
+                        slot = product % PRODUCT_SLOTS
+                        while keys[slot] != product:
+                            slot = (slot + 1) % PRODUCT_SLOTS
+                        value = values[slot]
+                    if value > best:
+                        best = value
+            results.append(best)
+        return results
+
+    @staticmethod
+    def _parts(codes, size: int) -> list:
+        """
+        :return: [prime product, rank bits, suit or -1 if mixed] of every size card subset of codes
+        """
+        parts = []
+        for combo in itertools.combinations(codes, size):
+            product = 1
+            bits = 0
+            suit = combo[0] & 3
+            for code in combo:
+                product *= PRIME[code]
+                bits |= RANK_BIT[code]
+                if code & 3 != suit:
+                    suit = -1
+            parts.append([product, bits, suit])
+        return parts
+
+
+VARIANT_NAMES = ['holdem', 'omaha', 'shortdeck']
+_VARIANTS = {}
+
+
+def variant(name: str, tables: dict = None) -> Variant:
+    """
+    Returns a variant, generating its tables the first time it is asked for unless tables are given
+    :param name: 'holdem', 'omaha' or 'shortdeck'
+    :type name: str
+    :param tables: prebuilt tables to use instead of the generated ones
+    :type tables: dict
+    :return: the variant
+    :rtype: Variant
+    """
+    if name not in _VARIANTS:
+        if name == 'holdem':
+            _VARIANTS[name] = Variant(name, range(13), 2, STANDARD_ORDER, tables=tables)
+        elif name == 'omaha':
+            _VARIANTS[name] = Variant(name, range(13), 4, STANDARD_ORDER, useHole=2, tables=tables)
+        elif name == 'shortdeck':
+            _VARIANTS[name] = Variant(name, range(4, 13), 2, SHORT_DECK_ORDER, tables=tables)
+        else:
+            raise ValueError('Unknown variant ' + name)
+    elif tables is not None:
+        _VARIANTS[name].useTables(tables)
+    return _VARIANTS[name]
@@ -0,0 +1,143 @@
+"""
+Background jobs for work that must not run on the frame loop
+Every job belongs to a hand, moving on to a new hand cancels the jobs still queued for the old one and drops any
+result that comes back from it, finished jobs are handed to a callback such as one posting a pygame event
+"""
+import concurrent.futures
+import threading
+import time
+
+
+class Job:
+    """
+    One piece of work and, once it is done, its result
+    """
+
+    def __init__(self, name: str, hand: int, function, args):
+        """
+        Constructor method
+        :param name: what the job is, so the receiver knows what to do with the result
+        :type name: str
+        :param hand: the hand the job belongs to
+        :type hand: int
+        :param function: what to run, it has to be a module level function when jobs run in processes
+        :param args: arguments for the function
+        """
+        self.name = name
+        self.hand = hand
+        self.function = function
+        self.args = args
+        self.result = None
+        self.error = None
+        self.seconds = 0.0
+        self._future = None
+
+
+def _run(function, args) -> list:
+    """
+    Runs a job's function where the pool puts it, timing it there so queueing is not counted
+    :return: [result, seconds]
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return [result, time.perf_counter() - start]
+
+
+class JobPool:
+    """
+    A pool of worker threads or processes running jobs for the current hand
+    """
+
+    def __init__(self, post, workers: int = 1, processes: bool = False):
+        """
+        Constructor method
+        :param post: called with each finished Job of the current hand, from a pool thread so it has to be thread
+            safe, pygame.event.post is
+        :param workers: how many jobs run at once
+        :type workers: int
+        :param processes: run jobs in processes, for pure Python work heavy enough to hold up the frame loop
+            through the GIL, the functions and their arguments then have to pickle
+        :type processes: bool
+        """
+        self._post = post
+        if processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(workers, 'job')
+        self._hand = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+
+    def hand(self) -> int:
+        """
+        :return: the current hand
+        :rtype: int
+        """
+        return self._hand
+
+    def submit(self, name: str, function, *args) -> Job:
+        """
+        Queues a job for the current hand
+        :param name: what the job is
+        :type name: str
+        :param function: what to run
+        :param args: arguments for the function
+        :return: the job
+        :rtype: Job
+        """
+        job = Job(name, self._hand, function, args)
+        with self._lock:
+            self._pending.append(job)
+            self.submitted += 1
+            job._future = self._executor.submit(_run, function, args)
+        job._future.add_done_callback(lambda future: self._finished(job, future))
+        return job
+
+    def _finished(self, job: Job, future):
+        """
+        Hands a finished job to the callback unless it belongs to an earlier hand
+        """
+        with self._lock:
+            if job in self._pending:
+                self._pending.remove(job)
+            stale = job.hand != self._hand or future.cancelled()
+            if stale:
+                self.dropped += 1
+        if stale:
+            return
+        try:
+            job.result, job.seconds = future.result()
+        except Exception as error:
+            job.error = error
+        self._post(job)
+
+    def newHand(self) -> int:
+        """
+        Moves on to the next hand, jobs of the old one that have not started are cancelled and the results of
+        the ones already running are thrown away when they finish
+        :return: the new hand
+        :rtype: int
+        """
+        with self._lock:
+            self._hand += 1
+            stale = self._pending
+            self._pending = []
+        for job in stale:
+            job._future.cancel()
+        return self._hand
+
+    def pending(self) -> int:
+        """
+        :return: jobs of the current hand that have not finished yet
+        :rtype: int
+        """
+        return len(self._pending)
+
+    def close(self):
+        """
+        Cancels everything queued and waits for the running jobs to finish
+        """
+        self.newHand()
+        self._executor.shutdown(wait=True, cancel_futures=True)